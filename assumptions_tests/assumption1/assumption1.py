@@ -1,9 +1,14 @@
-import pickle as pkl
 import random
+import sys
 from sys import argv
 from tqdm import tqdm
 import maude
 
+sys.path.append("../..")
+from array import array
+from brauermonoid import factor_code, word_to_names
+from factorization_db import load_factorizations
+
 def init():
     ''' Initilizes the maude package.
     '''
@@ -14,21 +19,16 @@ def init():
 def reduce(factorization, max_patience = "auto", dfs = True):
     ''' Reduces the input term as an equivalent and (possibly) smaller factorization. \n
     Arguments:
-        factorization : the factor list to be reduced \n
+        factorization : the word (array of factor codes, see brauermonoid.factor_code) to be reduced \n
         max_patience : integer, str (default: auto), how many steps inside a local minima are you willing to perform. If "auto" is equal to 1000 * length of term
     '''
 
-    if len(factorization) == 0: return []
-    if len(factorization) == 1: return factorization
-
-    factorization = [factor for factor in factorization if factor != "I"]
+    if len(factorization) <= 1: return factorization
 
-    # covert factor list to Maude term
+    # covert word to Maude term
     term = []
-    for factor in factorization:
-        if factor == "I": continue
-
-        term.append(f" {factor[0]} {factor[1:]} ")
+    for code in factorization:
+        term.append(f" {'U' if code > 0 else 'T'} {abs(code)} ")
 
     term = ",".join(term)
 
@@ -68,10 +68,12 @@ def reduce(factorization, max_patience = "auto", dfs = True):
         l = l.toInt()
 
         if l < t_len:
-            # covert Maude term to factor list
-            reduced_factorization = []
+            # covert Maude term to word
+            reduced_factorization = array("h")
             for factor in str(res[0]).split(","):
-                reduced_factorization.append(factor.replace(" ", ""))
+                factor = factor.replace(" ", "")
+                if factor == "I": continue
+                reduced_factorization.append(factor_code(factor))
             
             return reduce(reduced_factorization, max_patience)
         elif l > t_len:
@@ -109,8 +111,8 @@ class Tangle:
         
         return edge
 
-    def compose(self, prime_name):
-        type, i = prime_name[0], int(prime_name[1:])
+    def compose(self, code):
+        i = abs(code)
         
         e1 = self.delete_edge_containing(-i)
         e2 = self.delete_edge_containing(-(i+1))
@@ -119,7 +121,7 @@ class Tangle:
             self.edges.append(e1)
             return self
         
-        if type == "T":
+        if code < 0:
             if -i in e1:
                 e1.remove(-i)
                 e1.add(-(i+1))
@@ -207,23 +209,21 @@ def generators(n):
     gens = []
     
     for i in range(1,n):
-        name = f"U{i}"
-        gens.append((name, Tangle.u(i, n)))
+        gens.append((i, Tangle.u(i, n)))
     
     for i in range(1,n):
-        name = f"T{i}"
-        gens.append((name, Tangle.t(i, n)))
+        gens.append((-i, Tangle.t(i, n)))
     
     return gens
 
 def random_factorization(n, gens, scale = 2):
     fact_len = random.randint(2, int(scale * n*(n-1)//2)+1)
     tangle = Tangle.id(n)
-    fact = []
+    fact = array("h")
     for _ in range(fact_len):
-        prime_name, prime = random.choice(gens)
-        tangle.compose(prime_name)
-        fact.append(prime_name)
+        code, prime = random.choice(gens)
+        tangle.compose(code)
+        fact.append(code)
     
     return tangle, fact
 
@@ -245,9 +245,8 @@ bn_size = double_fact(2*n-1)
 max_patience = 2000000
 current_patience = max_patience
 
-with open(f"../../BN/b{n}.pkl", "rb") as f:
-    print(f"Loading BN/b{n}.pkl")
-    bn = pkl.load(f)
+print(f"Loading BN/b{n}")
+bn = load_factorizations(f"../../BN/b{n}")
 
 counterexample_found = False
 
@@ -264,7 +263,6 @@ with tqdm() as pbar:
             generated.add(tangle.base_diagram())
 
             predicted_factorization = reduce(factorization)
-            predicted_factorization = [factor for factor in predicted_factorization if factor != "I"]
 
             predicted_len = len(predicted_factorization)
             actual_len = len(actual_factorization)
@@ -273,7 +271,7 @@ with tqdm() as pbar:
                 counterexample_found = True
                 print("Found counterexample")
                 print(tangle)
-                print(f"Predicted len={predicted_len} : ", predicted_factorization)
+                print(f"Predicted len={predicted_len} : ", word_to_names(predicted_factorization))
                 print(f"Actual len={actual_len} : ", actual_factorization)
                 break
         
@@ -2,9 +2,12 @@ import sage.all
 import sage.combinat.diagram_algebras as da
 from tqdm import tqdm
 
-import pickle as pkl
+import sys
 from sys import argv
 
+sys.path.append("../..")
+from factorization_db import load_factorizations
+
 def n_T_primes(f):
     s = 0
     for fact in f:
@@ -46,20 +49,19 @@ _, n = argv
 
 bd = da.BrauerDiagrams(int(n))
 
-with open(f"../../BN/b{bd.order}.pkl", "rb") as f:
-    print(f"Loading BN/b{n}.pkl")
-    bn = pkl.load(f)
-    counterexample_found = False
-    for tangle_edges, factorization in tqdm(bn.items()):
-        tangle = bd(tangle_edges)
-        nc = n_crossings(tangle)
-        nt = n_T_primes(factorization)
-        if nc != nt:
-            counterexample_found = True
-            print("Found counterexample")
-            print(tangle)
-            print(f"Number of crossings = {nc}")
-            print(f"Number of T-primes = {nt}")
+print(f"Loading BN/b{n}")
+bn = load_factorizations(f"../../BN/b{bd.order}")
+counterexample_found = False
+for tangle_edges, factorization in tqdm(bn.items()):
+    tangle = bd(tangle_edges)
+    nc = n_crossings(tangle)
+    nt = n_T_primes(factorization)
+    if nc != nt:
+        counterexample_found = True
+        print("Found counterexample")
+        print(tangle)
+        print(f"Number of crossings = {nc}")
+        print(f"Number of T-primes = {nt}")
 
 if not counterexample_found:
     print(f"No counterexamples found in B{n}")
@@ -0,0 +1,159 @@
+#benchmarks of the hot paths of the factorization and of the enumeration
+#usage: python benchmarks.py [--sizes N ...] [--benchmarks NAME ...] [--seed S] [--min-time T] [-o results.json]
+#every benchmark runs on random diagrams drawn from a seeded generator, so two runs (for
+#example under CPython and under PyPy) measure the same inputs. The report is written as
+#JSON with, for every benchmark and N, the throughput, the latency of a single call and
+#the peak memory allocated by a single call (measured with tracemalloc, when available)
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from brauermonoid import Tangle, factorizeBN, factorizeSN, merge, merged_edges, normalize_edge, tau
+from pmatch import perfect_matchings_iterator
+from sampling import random_edges
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+DEFAULT_SIZES = [4, 8, 16, 32, 64, 128, 256]
+
+def random_merge(N, rng):
+    # a random tangle with the hook (i, i+1) and an edge that can be merged with it
+    while True:
+        X = Tangle(random_edges(N, rng))
+        i = rng.randint(1, N-1)
+        a = X.get_edge_from(i)
+        b = X.get_edge_from(i+1)
+        if a != b:
+            p = a[0] if a[1] == i else a[1]
+            q = b[0] if b[1] == i+1 else b[1]
+            inv = [e for e in X.inv if e != a and e != b] + [(i, i+1), normalize_edge((p, q))]
+            X = Tangle(inv)
+        h = (i, i+1)
+        edges = [e for e in sorted(X.inv) if merged_edges(h, e) is not None]
+        if len(edges) > 0:
+            return X, h, rng.choice(edges)
+
+def _inputs(make):
+    # endless generator of the arguments make(N, rng) of the calls of a benchmark
+    def inputs(N, rng):
+        while True:
+            yield make(N, rng)
+    return inputs
+
+def _matchings_inputs(N, rng):
+    # every call advances the same iterator, which is restarted when exhausted
+    def matchings():
+        while True:
+            yield from perfect_matchings_iterator(N)
+    
+    it = matchings()
+    while True:
+        yield (it,)
+
+# every benchmark is a pair (inputs, function): inputs(N, rng) generates the tuples of
+# arguments and one call is function(*arguments). Only the calls are measured
+BENCHMARKS = {
+    "Tangle" : (_inputs(lambda N, rng: (random_edges(N, rng),)), Tangle),
+    "_calculate_crossings" : (_inputs(lambda N, rng: (Tangle(random_edges(N, rng), calculate_crossings = False),)), Tangle._calculate_crossings),
+    "tau" : (_inputs(lambda N, rng: (Tangle(random_edges(N, rng)),)), tau),
+    "factorizeSN" : (_inputs(lambda N, rng: (tau(Tangle(random_edges(N, rng))),)), factorizeSN),
+    "factorizeBN" : (_inputs(lambda N, rng: (Tangle(random_edges(N, rng)), False)), factorizeBN),
+    "factorizeBN_minimize_Ts" : (_inputs(lambda N, rng: (Tangle(random_edges(N, rng)), True)), factorizeBN),
+    "merge" : (_inputs(random_merge), merge),
+    "perfect_matchings_iterator" : (_matchings_inputs, next),
+}
+
+def peak_memory(function, args):
+    ''' Peak number of bytes allocated by function(*args), None without tracemalloc.
+    '''
+    if tracemalloc is None: return None
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(name, N, seed, min_time = 0.2, min_calls = 3, memory = True):
+    ''' Runs the benchmark name on diagrams with N strands: new inputs are measured
+    one call at a time until at least min_calls calls and min_time seconds.
+    '''
+    rng = random.Random(f"{seed}/{name}/{N}")
+    inputs, function = BENCHMARKS[name]
+    inputs = inputs(N, rng)
+
+    latencies = []
+    while len(latencies) < min_calls or sum(latencies) < min_time:
+        args = next(inputs)
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+
+    total = sum(latencies)
+    return {
+        "benchmark" : name,
+        "N" : N,
+        "calls" : len(latencies),
+        "total_s" : total,
+        "throughput_per_s" : len(latencies) / total if total > 0 else None,
+        "latency_s" : {
+            "mean" : total / len(latencies),
+            "median" : statistics.median(latencies),
+            "min" : min(latencies),
+            "max" : max(latencies),
+        },
+        "peak_memory_bytes" : peak_memory(function, next(inputs)) if memory else None,
+    }
+
+def environment():
+    return {
+        "implementation" : platform.python_implementation(),
+        "python_version" : platform.python_version(),
+        "platform" : platform.platform(),
+        "machine" : platform.machine(),
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the factorization and enumeration hot paths.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = DEFAULT_SIZES, help = "numbers of strands N")
+    parser.add_argument("--benchmarks", nargs = "+", choices = list(BENCHMARKS), default = list(BENCHMARKS), help = "benchmarks to run (default: all)")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the random diagrams")
+    parser.add_argument("--min-time", type = float, default = 0.2, help = "minimum measured seconds of every benchmark and N")
+    parser.add_argument("--min-calls", type = int, default = 3, help = "minimum number of calls of every benchmark and N")
+    parser.add_argument("--no-memory", action = "store_true", help = "do not measure the peak memory")
+    parser.add_argument("-o", "--output", default = "-", help = "JSON report (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.benchmarks:
+        for N in args.sizes:
+            if name == "merge" and N < 2: continue
+            result = run(name, N, args.seed, args.min_time, args.min_calls, memory = not args.no_memory)
+            results.append(result)
+            print(f"{name} N={N}: {result['latency_s']['mean']:.3g} s/call", file = sys.stderr)
+
+    report = {
+        "environment" : environment(),
+        "seed" : args.seed,
+        "min_time" : args.min_time,
+        "min_calls" : args.min_calls,
+        "results" : results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 #walks the Cayley Graph of Bn and generates a dictionaty tangle:factorization
 #where the factorization has the least amount of T-primes possible
+#only the last factor and the parent of every tangle are stored (see cayley.CayleyTable),
+#the factorizations are rebuilt one at a time while writing BN/b{n}.fdb (see factorization_db.py)
 
 
 import sage.all
@@ -7,9 +9,14 @@ import sage.combinat.diagram_algebras as da
 from tqdm import tqdm
 
 from collections import deque
-import pickle as pkl
+import os
 from sys import argv
 
+from brauermonoid import factor_code
+from cayley import CayleyTable
+from factorization_db import write_db
+from pmatch import rank_diagram
+
 def double_fact(N):
     if N == 0 or N == 1:
         return 1
@@ -46,26 +53,24 @@ bd = da.BrauerDiagrams(int(n))
 gens, identity = generators(bd)
 
 queue = deque()
-queue.appendleft((identity, []))
-
-black_nodes = {identity.base_diagram() : []}
+table = CayleyTable(bd.order)
+queue.appendleft((identity, table.root))
 
 limit = double_fact(2*bd.order-1)
 
 with tqdm(total=int(limit)) as pbar:
   while len(queue) > 0:
         
-        tangle, factorization = queue.pop()
+        tangle, r = queue.pop()
 
         pbar.update(1)
 
         for prime_tangle, prime_name in gens:
             neigh, loops_removed = tangle.compose(prime_tangle, check = False)
-            neigh_factorization = factorization + [prime_name]
+            r_neigh = rank_diagram(neigh.base_diagram())
             
-            if neigh.base_diagram() not in black_nodes:
-                black_nodes[neigh.base_diagram()] = neigh_factorization
-                queue.appendleft((neigh, neigh_factorization))
+            if table.visit(r_neigh, r, factor_code(prime_name)):
+                queue.appendleft((neigh, r_neigh))
 
-with open(f"BN/b{bd.order}.pkl", "wb") as f:
-    pkl.dump(black_nodes, f)
+os.makedirs("BN", exist_ok = True)
+write_db(f"BN/b{bd.order}.fdb", bd.order, table.items())
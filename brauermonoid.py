@@ -1,5 +1,84 @@
+from array import array
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from enum import Enum
 from functools import partial
+from itertools import chain
+from time import perf_counter
+
+from pmatch import FenwickTree, diagram_to_involution, node_index
+
+class FactorizationStats:
+    ''' Counters and timers collected while the instrumentation is enabled. \n
+    Counters:
+        factorizations : calls of factorizeBN \n
+        merges_attempted : merges evaluated with merge_plan or evaluate_merge \n
+        merges_accepted : merges applied with apply_merge \n
+        crossings_recomputed : full recomputations of the crossing numbers of a tangle \n
+        copies : copies of tangles \n
+        compose_with_T : calls of compose_with_T
+    Timers, in seconds, of the phases of factorizeBN:
+        tau, SN (the sort of factorizeSN), setup (the scratch copy and its MergeIndex),
+        U (the U steps), T (the T steps)
+    '''
+
+    COUNTERS = ("factorizations", "merges_attempted", "merges_accepted", "crossings_recomputed", "copies", "compose_with_T")
+    TIMERS = ("tau", "SN", "setup", "U", "T")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.timers = dict.fromkeys(self.TIMERS, 0.0)
+
+    def count(self, name, n = 1):
+        self.counters[name] += n
+
+    def time(self, name, seconds):
+        self.timers[name] += seconds
+
+    def as_dict(self):
+        return {"counters" : dict(self.counters), "timers" : dict(self.timers)}
+
+    def __repr__(self) -> str:
+        return f"FactorizationStats({self.as_dict()})"
+
+# the enabled FactorizationStats, None when the instrumentation is disabled: every
+# instrumented function only tests it against None when it is disabled
+_stats = None
+
+def enable_instrumentation(stats = None):
+    ''' Starts collecting statistics into stats (a new FactorizationStats if None)
+    and returns it.
+    '''
+    global _stats
+    _stats = FactorizationStats() if stats is None else stats
+    return _stats
+
+def disable_instrumentation():
+    ''' Stops collecting statistics and returns the ones collected so far.
+    '''
+    global _stats
+    stats, _stats = _stats, None
+    return stats
+
+@contextmanager
+def instrumentation(stats = None):
+    ''' Context manager enabling the instrumentation inside a with block:
+
+        with instrumentation() as stats:
+            factorizeBN(X)
+        print(stats.counters, stats.timers)
+    '''
+    previous = _stats
+    stats = enable_instrumentation(stats)
+    try:
+        yield stats
+    finally:
+        disable_instrumentation()
+        if previous is not None:
+            enable_instrumentation(previous)
 
 class EdgeType(Enum):
     upper_hook = 1
@@ -19,6 +98,263 @@ def edge_type(edge):
 def size(edge):
    return abs(abs(edge[0]) - abs(edge[1]))
 
+def factor_code(name):
+    # U_i is encoded as i and T_i as -i, with i >= 1
+    if name[:1] not in ("U", "T") or not name[1:].isdigit() or int(name[1:]) < 1:
+        raise ValueError(f"unknown factor {name}")
+    i = int(name[1:])
+    return i if name[0] == "U" else -i
+
+def factor_name(code):
+    if code == 0:
+        raise ValueError("0 is not a factor code")
+    return f"U{code}" if code > 0 else f"T{-code}"
+
+# A word is an array('h') of factor codes. The factorization functions build
+# words and only convert them to lists of names when returning.
+
+def word_from_names(names):
+    # names can mix factor names and codes, the identity I is dropped
+    return array("h", [factor_code(f) if isinstance(f, str) else f for f in names if f != "I"])
+
+def word_to_names(word):
+    # the empty word is the identity, written as ["I"]
+    if len(word) == 0: return ["I"]
+    return [factor_name(code) for code in word]
+
+def apply_factor(partner, code):
+    ''' Multiplies on the right, in place, the diagram given as a partner array
+    (in the layout of CompactTangle) by the factor with the given code. Only the
+    bottom nodes -i and -(i+1) are rewired, so this costs O(1). Raises ValueError
+    if the factor is not in B_N, that is if not 1 <= i <= N-1.
+    '''
+    i = abs(code)
+    if not 1 <= i < len(partner) // 2:
+        raise ValueError(f"{factor_name(code) if code != 0 else code} is not a factor of B_{len(partner) // 2}")
+    a = len(partner) - i # node -i
+    b = a - 1 # node -(i+1)
+    x, y = partner[a], partner[b]
+    if x == b: return # U_i only removes a loop, T_i fixes the hook
+
+    if code > 0:
+        partner[x], partner[y] = y, x
+        partner[a], partner[b] = b, a
+    else:
+        partner[x], partner[b] = b, x
+        partner[y], partner[a] = a, y
+
+def evaluate_word(word, N):
+    ''' Partner array (in the layout of CompactTangle) of the product of the factors
+    of word, a sequence of factor codes or names, in B_N. Costs O(N + len(word)).
+    Raises ValueError if a factor is not in B_N.
+    '''
+    partner = array("h", range(2*N - 1, -1, -1)) # the identity, i to -i
+    for code in word_from_names(word):
+        apply_factor(partner, code)
+    return partner
+
+def is_factorization(X, word):
+    ''' True if word (factor codes or names) is a factorization of X of length len(X).
+    A word with a factor that is not in B_N is not a factorization.
+    '''
+    length = sum(1 for code in word if code != "I")
+    if length != len(X): return False
+    try:
+        return evaluate_word(word, X.N) == partner_array(X)
+    except ValueError:
+        return False
+
+def chord_crossings(partner):
+    ''' Number of crossings of every chord of a perfect matching of the points
+    0, ..., 2N-1 laid on a circle, where partner[i] is the point matched to i.
+    The count of a chord is reported at both of its endpoints.
+
+    A chord (p,q) is crossed by every chord with exactly one endpoint strictly
+    between p and q, that is by the q-p-1 inner points minus twice the chords
+    nested inside it. Nested chords are counted with a sweep over the right
+    endpoints, for a total of O(N log N) operations.
+    '''
+    crossings = [0] * len(partner)
+    left_endpoints = FenwickTree(len(partner))
+    for q, p in enumerate(partner):
+        if p > q: continue
+        nested = left_endpoints.prefix_sum(q) - left_endpoints.prefix_sum(p+1)
+        left_endpoints.add(p)
+        crossings[p] = crossings[q] = q - p - 1 - 2*nested
+    
+    return crossings
+
+def count_crossings(inv, N):
+    ''' Returns the dictionary edge:number of crossings of the edges in inv
+    and the total number of crossings.
+    '''
+    def phi(x):
+        i = abs(x)
+        if x < 0: return i - 1
+
+        return 2*N - i
+
+    partner = [0] * (2*N)
+    for x,y in inv:
+        partner[phi(x)] = phi(y)
+        partner[phi(y)] = phi(x)
+    
+    crossings = chord_crossings(partner)
+    n_crossings = {}
+    total = 0
+    for edge in inv:
+        nc = crossings[phi(edge[0])]
+        n_crossings[tuple(edge)] = nc
+        total += nc
+    
+    return n_crossings, total // 2
+
+class PartnerStatistics:
+    ''' Crossing numbers, length and number of components of the tangle with the
+    given partner array (in the layout of CompactTangle), kept up to date while
+    the array is rewired one step at a time by rewire.
+
+    A component is a block of consecutive strands not joined by any edge to
+    the other strands: the gap between the strands i and i+1 separates two
+    blocks when no edge spans it, so the gaps spanned by every edge are counted.
+    '''
+
+    def __init__(self, partner):
+        self.N = N = len(partner) // 2
+        self.partner = list(partner)
+        self.crossings = chord_crossings(self.partner)
+        # |node| of every index
+        self.strand = [a + 1 if a < N else 2*N - a for a in range(2*N)]
+        self.total = 0
+        for a in range(2*N):
+            self.total += self._term(a)
+
+        self.cover = [0] * (N+1)
+        self.uncovered = max(N - 1, 0)
+        for a, b in enumerate(self.partner):
+            if a < b: self._cover(a, b, 1)
+
+    def _term(self, a):
+        # contribution of the node a to 4 len()
+        size = abs(self.strand[a] - self.strand[self.partner[a]])
+        return max(size, self.crossings[a])
+
+    def _cover(self, a, b, v):
+        lo, hi = sorted((self.strand[a], self.strand[b]))
+        cover = self.cover
+        for i in range(lo, hi):
+            if cover[i] == 0: self.uncovered -= 1
+            cover[i] += v
+            if cover[i] == 0: self.uncovered += 1
+
+    def _add_crossings(self, a, v):
+        self.total -= self._term(a)
+        self.crossings[a] += v
+        self.total += self._term(a)
+
+    def _crossing_chords(self, a, b):
+        # one endpoint of every chord crossing (a,b), walking the shorter arc
+        a, b = sorted((a, b))
+        partner = self.partner
+        if b - a - 1 <= self.N - 1:
+            arc = range(a+1, b)
+        else:
+            arc = chain(range(b+1, 2*self.N), range(0, a))
+        for r in arc:
+            if (a < r < b) != (a < partner[r] < b):
+                yield r
+
+    def __len__(self):
+        return self.total // 4
+
+    def n_crossings(self):
+        return sum(self.crossings) // 4
+
+    def n_components(self):
+        return self.uncovered + 1
+
+    def rewire(self, x, y, j, J):
+        ''' Replaces the chords (x,y) and (j,J) with (x,j) and (y,J), as in a step
+        of pmatch.perfect_matchings_deltas, in O(N) operations.
+        '''
+        partner = self.partner
+        old = {x, y, j, J}
+
+        for a, b in ((x, y), (j, J)):
+            for r in self._crossing_chords(a, b):
+                if r in old: continue
+                self._add_crossings(r, -1)
+                self._add_crossings(partner[r], -1)
+            self._cover(a, b, -1)
+            self.total -= self._term(a) + self._term(b)
+
+        partner[x] = j
+        partner[j] = x
+        partner[y] = J
+        partner[J] = y
+
+        for a, b in ((x, j), (y, J)):
+            n = 0
+            for r in self._crossing_chords(a, b):
+                n += 1
+                if r in old: continue
+                self._add_crossings(r, 1)
+                self._add_crossings(partner[r], 1)
+            self.crossings[a] = self.crossings[b] = n
+            self._cover(a, b, 1)
+            self.total += self._term(a) + self._term(b)
+
+class ChordStatistics(PartnerStatistics):
+    ''' Same as PartnerStatistics for a partial partner array (-1 for the unmatched
+    nodes) completed one chord at a time by add, always from the smallest unmatched
+    node, and undone by remove in the reverse order.
+
+    The other endpoint of every chord crossing a new chord (a,b) is then smaller than
+    a, so these chords are the ones with an endpoint between a and b.
+    '''
+
+    def __init__(self, partner):
+        self.N = N = len(partner) // 2
+        self.partner = [-1] * (2*N)
+        self.crossings = [0] * (2*N)
+        self.strand = [a + 1 if a < N else 2*N - a for a in range(2*N)]
+        self.total = 0
+        self.cover = [0] * (N+1)
+        self.uncovered = max(N - 1, 0)
+        for a, b in enumerate(partner):
+            if a < b: self.add(a, b)
+
+    def add(self, a, b):
+        self._update_crossings(a, b, 1)
+        partner = self.partner
+        partner[a] = b
+        partner[b] = a
+        self._cover(a, b, 1)
+        self.total += self._term(a) + self._term(b)
+
+    def remove(self, a, b):
+        self._cover(a, b, -1)
+        self.total -= self._term(a) + self._term(b)
+        partner = self.partner
+        partner[a] = partner[b] = -1
+        self._update_crossings(a, b, -1)
+
+    def _update_crossings(self, a, b, v):
+        # adds v to the chords with an endpoint between a and b, and sets the crossings of (a,b)
+        partner, crossings, strand = self.partner, self.crossings, self.strand
+        total = self.total
+        n = 0
+        for r in range(a+1, b):
+            q = partner[r]
+            if q == -1: continue
+            n += 1
+            size = abs(strand[r] - strand[q])
+            c = crossings[r]
+            total += 2 * (max(size, c + v) - max(size, c))
+            crossings[r] = crossings[q] = c + v
+        crossings[a] = crossings[b] = n
+        self.total = total
+
 class Tangle:
     def __init__(self, inv, calculate_crossings = True):
         self.N = len(inv)
@@ -28,6 +364,7 @@ class Tangle:
            self.inv_dict[x] = (x,y)
            self.inv_dict[y] = (x,y)
         
+        self.n_crossings = None
         if calculate_crossings:
             self._calculate_crossings()
         
@@ -35,6 +372,8 @@ class Tangle:
         return self.inv_dict[node]
 
     def get_n_crossings(self, edge = None):
+        if self.n_crossings is None:
+            self._calculate_crossings()
         if edge is not None:
            return self.n_crossings[edge]
         else:
@@ -44,13 +383,16 @@ class Tangle:
             
             return nc // 2
     
+    def set_n_crossings(self, edge, n):
+        self.n_crossings[edge] = n
 
     def _calculate_crossings(self):
-        self.n_crossings = {}
-        for edge in self.inv:
-           self.n_crossings[tuple(edge)] = self.n_intersecting_edges(edge)
+        if _stats is not None: _stats.count("crossings_recomputed")
+        self.n_crossings, _ = count_crossings(self.inv, self.N)
 
     def __len__(self):
+        if self.n_crossings is None:
+            self._calculate_crossings()
         l = 0
         for edge in self.inv:
             l += max(size(edge), self.n_crossings[edge])
@@ -89,6 +431,7 @@ class Tangle:
         return str(self.inv)
     
     def copy(self):
+        if _stats is not None: _stats.count("copies")
         X_new = Tangle(self.inv, calculate_crossings=False)
         X_new.n_crossings = self.n_crossings.copy()
         return X_new
@@ -106,29 +449,195 @@ class Tangle:
         del self.inv_dict[edge[1]]
         del self.n_crossings[edge]
 
-def text_to_tangle(text):
-    inv = []
-    pairs = text.split(",")
-    for pair in pairs:
-        a,b = pair.split(":")
-        if "'" in a:
-            a = -int(a.replace("'",""))
-        else:
-            a = int(a)
-        if "'" in b:
-            b = -int(b.replace("'",""))
+def normalize_edge(edge):
+    # orientation used by Tangle: upper hooks ascending, lower hooks
+    # ascending by absolute value, transversals from the top node
+    x,y = edge
+    if abs(y) < abs(x):
+        x,y = y,x
+    if x < 0 and y > 0:
+        x,y = y,x
+    
+    return (x,y)
+
+class CompactTangle:
+    '''Tangle stored as a flat partner array over its 2N nodes.
+
+    Node i is stored at index i-1 and node -i at index 2N-i, which is the
+    labelling used by pmatch.brauer_diagrams. The crossing number of an edge
+    is stored at both of its endpoints. The class exposes the same interface
+    as Tangle, so it can be passed to merge, compose_with_T, tau and the
+    factorization functions.
+    '''
+
+    __slots__ = ("N", "partner", "crossings")
+
+    def __init__(self, inv, calculate_crossings = True):
+        self.N = len(inv)
+        typecode = "b" if 2*self.N <= 128 else "h"
+        self.partner = array(typecode, [-1]) * (2*self.N)
+        self.crossings = array(typecode, [0]) * (2*self.N)
+        for x,y in inv:
+            a = self._index(x)
+            b = self._index(y)
+            self.partner[a] = b
+            self.partner[b] = a
+        
+        if calculate_crossings:
+            self._calculate_crossings()
+
+    @classmethod
+    def from_tangle(cls, X : Tangle):
+        if _stats is not None: _stats.count("copies")
+        X_new = cls(X.inv, calculate_crossings=False)
+        for edge in X.inv:
+            X_new.set_n_crossings(edge, X.get_n_crossings(edge))
+        return X_new
+
+    @classmethod
+    def from_partner(cls, partner, calculate_crossings = True):
+        ''' Tangle with the given partner array (any sequence of 2N indices).
+        '''
+        X = cls.__new__(cls)
+        X.N = len(partner) // 2
+        typecode = "b" if len(partner) <= 128 else "h"
+        X.partner = array(typecode, partner)
+        X.crossings = array(typecode, [0]) * len(partner)
+        if calculate_crossings:
+            X._calculate_crossings()
+        return X
+
+    def to_tangle(self):
+        inv = self.inv
+        X = Tangle(inv, calculate_crossings=False)
+        X.n_crossings = {edge : self.get_n_crossings(edge) for edge in inv}
+        return X
+
+    def _index(self, node):
+        return node_index(node, self.N)
+
+    def _node(self, idx):
+        if idx < self.N: return idx + 1
+        return idx - 2*self.N
+
+    @property
+    def inv(self):
+        node = self._node
+        return [normalize_edge((node(a), node(b)))
+                for a, b in enumerate(self.partner) if a < b]
+
+    def get_edge_from(self, node):
+        a = self._index(node)
+        return normalize_edge((node, self._node(self.partner[a])))
+
+    def get_n_crossings(self, edge = None):
+        if edge is not None:
+            return self.crossings[self._index(edge[0])]
         else:
-            b = int(b)
+            return sum(self.crossings) // 4
+
+    def set_n_crossings(self, edge, n):
+        self.crossings[self._index(edge[0])] = n
+        self.crossings[self._index(edge[1])] = n
+
+    def _calculate_crossings(self):
+        if _stats is not None: _stats.count("crossings_recomputed")
+        self.crossings = array(self.crossings.typecode, chord_crossings(self.partner))
+
+    def __len__(self):
+        # |node| is a+1 for the indices of the top row and 2N-a for the bottom one
+        N2 = 2*self.N
+        l = 0
+        for a, b in enumerate(self.partner):
+            x = a + 1 if a < self.N else N2 - a
+            y = b + 1 if b < self.N else N2 - b
+            l += max(abs(x - y), self.crossings[a])
         
-        inv.append((a,b))
+        return l // 4
+
+    def __contains__(self, edge):
+        a = self._index(edge[0])
+        return self.partner[a] == self._index(edge[1])
+
+    def are_intersecting_edges(self, e1, e2):
+        # phi(x) = 2N - index(x), so the circle order is the reversed index order
+        a, b = sorted((self._index(e1[0]), self._index(e1[1])))
+        c, d = sorted((self._index(e2[0]), self._index(e2[1])))
+
+        return a < c < b < d or c < a < d < b
+
+    def n_intersecting_edges(self, edge):
+        n = 0
+        for e in self.inv:
+            if e == edge:
+                continue
+            if self.are_intersecting_edges(edge, e):
+                n += 1
+        return n
+
+    def __repr__(self) -> str:
+        return str(set(self.inv))
+
+    def copy(self):
+        if _stats is not None: _stats.count("copies")
+        X_new = CompactTangle.__new__(CompactTangle)
+        X_new.N = self.N
+        X_new.partner = self.partner[:]
+        X_new.crossings = self.crossings[:]
+        return X_new
+
+    def add_edge(self, edge):
+        a = self._index(edge[0])
+        b = self._index(edge[1])
+        self.partner[a] = b
+        self.partner[b] = a
+        self.crossings[a] = 0
+        self.crossings[b] = 0
+
+    def delete_edge(self, edge):
+        for node in edge:
+            a = self._index(node)
+            self.partner[a] = -1
+            self.crossings[a] = 0
+
+def parse_node(text):
+    # "4" is the node 4 and "4'" the node -4
+    text = text.strip()
+    if text[-1] == "'":
+        return -int(text[:-1])
+    return int(text)
+
+def text_to_tangle(text, tangle_class = Tangle):
+    inv = []
+    for pair in text.split(","):
+        a,b = pair.split(":")
+        inv.append((parse_node(a), parse_node(b)))
     
-    return Tangle(inv)
+    return tangle_class(inv)
 
+def tangle_to_text(X):
+    def label(x):
+        return str(x) if x > 0 else f"{-x}'"
+    
+    pairs = []
+    seen = set()
+    for node in list(range(1, X.N+1)) + list(range(-1, -X.N-1, -1)):
+        if node in seen: continue
+        x,y = X.get_edge_from(node)
+        seen.add(x)
+        seen.add(y)
+        pairs.append(f"{label(x)}:{label(y)}")
+    
+    return ",".join(pairs)
 
 
 
 
-def merge(X : Tangle, h, e):
+
+def merged_edges(h, e):
+    ''' The edges (e1, e2) that replace the hook h and the edge e in merge,
+    or None if the merge is not defined.
+    '''
     i = h[0]
     x,y = e
     t = edge_type(e)
@@ -147,6 +656,13 @@ def merge(X : Tangle, h, e):
     else: 
         return None
     
+    return e1, e2
+
+def merge(X : Tangle, h, e):
+    new_edges = merged_edges(h, e)
+    if new_edges is None: return None
+    e1, e2 = new_edges
+
     X.delete_edge(h)
     X.delete_edge(e)
 
@@ -154,13 +670,219 @@ def merge(X : Tangle, h, e):
     X.add_edge(e2)
 
     return e1, e2
+
+def crossing_edges(X, edge):
+    ''' Yields the edges of X crossing edge.
+
+    The edges crossing (a,b) are exactly the edges with one endpoint on each
+    side of the chord, so it is enough to walk the nodes of the shorter of the
+    two arcs between phi(a) and phi(b): this costs O(N) operations at most
+    and no more than the size of the edge for short edges.
+    '''
+    N = X.N
+    if isinstance(X, CompactTangle):
+        yield from _compact_crossing_edges(X, edge)
+        return
+
+    def phi(x):
+        i = abs(x)
+        if x < 0: return i
+
+        return 2*N - i + 1
+
+    def phi_inv(p):
+        if p <= N: return -p
+
+        return 2*N - p + 1
+
+    p, q = sorted((phi(edge[0]), phi(edge[1])))
+    if q - p - 1 <= N - 1:
+        arc = range(p+1, q)
+    else:
+        arc = list(range(q+1, 2*N+1)) + list(range(1, p))
+    
+    for r in arc:
+        d = X.get_edge_from(phi_inv(r))
+        if (p < phi(d[0]) < q) != (p < phi(d[1]) < q):
+            yield d
+
+def _compact_crossing_edges(X, edge):
+    # crossing_edges on the partner array: phi reverses the index order, so the
+    # arcs between the endpoints are ranges of indices
+    a, b = sorted((X._index(edge[0]), X._index(edge[1])))
+    if b - a - 1 <= X.N - 1:
+        arc = range(a+1, b)
+    else:
+        arc = chain(range(b+1, 2*X.N), range(0, a))
+    
+    partner = X.partner
+    for r in arc:
+        p = partner[r]
+        if (a < r < b) != (a < p < b):
+            yield normalize_edge((X._node(r), X._node(p)))
+
+def merge_plan(X : Tangle, h, e):
+    ''' Computes what merge_incremental(X, h, e) would do, without modifying X.
+    Returns None if the merge is not defined, otherwise (e1, e2, n1, n2, changes)
+    where n1, n2 are the crossing numbers of the new edges and changes maps the
+    other edges crossing h, e, e1 or e2 to the change of their crossing number.
+    '''
+    if _stats is not None: _stats.count("merges_attempted")
+    return _merge_plan(X, h, e)
+
+def _merge_plan(X, h, e):
+    new_edges = merged_edges(h, e)
+    if new_edges is None: return None
+    e1, e2 = new_edges
+
+    changes = {}
+    for old_edge in (h, e):
+        for d in crossing_edges(X, old_edge):
+            if d != h and d != e:
+                changes[d] = changes.get(d, 0) - 1
+
+    # the nodes of e1 and e2 still belong to h and e, which are skipped,
+    # so the crossing between e1 and e2 is counted separately
+    n1 = n2 = 0
+    for d in crossing_edges(X, e1):
+        if d != h and d != e:
+            changes[d] = changes.get(d, 0) + 1
+            n1 += 1
+    for d in crossing_edges(X, e2):
+        if d != h and d != e:
+            changes[d] = changes.get(d, 0) + 1
+            n2 += 1
+    if X.are_intersecting_edges(e1, e2):
+        n1 += 1
+        n2 += 1
+
+    return e1, e2, n1, n2, changes
+
+def merge_deltas(X : Tangle, h, e, plan):
+    ''' Change of len(X) and of X.get_n_crossings() caused by the merge of plan.
+    '''
+    e1, e2, n1, n2, changes = plan
+    c_h = X.get_n_crossings(h)
+    c_e = X.get_n_crossings(e)
+
+    # both are doubled: every edge contributes max(size, crossings) to 2 len(X)
+    # and its crossing number to 2 X.get_n_crossings()
+    dl = max(size(e1), n1) + max(size(e2), n2) - max(size(h), c_h) - max(size(e), c_e)
+    dc = n1 + n2 - c_h - c_e
+    for d, k in changes.items():
+        if k == 0: continue
+        c = X.get_n_crossings(d)
+        s = size(d)
+        dl += max(s, c + k) - max(s, c)
+        dc += k
+
+    return dl // 2, dc // 2
+
+def _merge_tables(spans):
+    # the chord between points[j] and points[k] separates the arcs j+1, ..., k from
+    # the others (the arcs 0 and 4 are the same arc of the circle). Returns, for
+    # the arcs x, y of the endpoints of a chord, the change of its crossing number
+    # and whether it crosses e1 and e2
+    def crossing(span):
+        j, k = span
+        inside = [j < x <= k for x in range(5)]
+        return [[int(inside[x] != inside[y]) for y in range(5)] for x in range(5)]
+
+    old_h, old_e, new1, new2 = [crossing(span) for span in spans]
+    change = [[new1[x][y] + new2[x][y] - old_h[x][y] - old_e[x][y] for y in range(5)] for x in range(5)]
+    return change, new1, new2
+
+# _merge_tables of the few possible positions of h, e, e1 and e2 among their points
+_MERGE_TABLES = {}
+
+def _compact_merge_deltas(X, h, e, e1, e2):
+    # merge_deltas on the partner array, in one pass and without building the plan.
+    # h, e, e1 and e2 are chords on the same four points, which cut the indices into
+    # five ranges (arcs): whether another chord crosses each of them only depends on
+    # the arcs of its endpoints
+    index = X._index
+    chords = [(index(u), index(v)) for u, v in (h, e, e1, e2)]
+    points = sorted(chords[0] + chords[1])
+    spans = tuple(tuple(sorted((points.index(u), points.index(v)))) for u, v in chords)
+    tables = _MERGE_TABLES.get(spans)
+    if tables is None:
+        tables = _MERGE_TABLES[spans] = _merge_tables(spans)
+    change, new1, new2 = tables
+
+    N = X.N
+    partner = X.partner
+    crossings = X.crossings
+    p0, p1, p2, p3 = points
+    bounds = (-1, p0, p1, p2, p3, 2*N)
+    dl = dc = n1 = n2 = 0
+    for x in range(5):
+        row, row1, row2 = change[x], new1[x], new2[x]
+        for r in range(bounds[x] + 1, bounds[x+1]):
+            p = partner[r]
+            if p < r: continue
+            y = (p > p0) + (p > p1) + (p > p2) + (p > p3)
+            n1 += row1[y]
+            n2 += row2[y]
+            k = row[y]
+            if k == 0: continue
+            c = crossings[r]
+            s = abs((r + 1 if r < N else 2*N - r) - (p + 1 if p < N else 2*N - p))
+            dl += max(s, c + k) - max(s, c)
+            dc += k
+
+    # e1 and e2 cross if their spans interleave
+    (j1, k1), (j2, k2) = spans[2], spans[3]
+    if j1 < j2 < k1 < k2 or j2 < j1 < k2 < k1:
+        n1 += 1
+        n2 += 1
+
+    c_h = X.get_n_crossings(h)
+    c_e = X.get_n_crossings(e)
+    dl += max(size(e1), n1) + max(size(e2), n2) - max(size(h), c_h) - max(size(e), c_e)
+    dc += n1 + n2 - c_h - c_e
+    return dl // 2, dc // 2
+
+def evaluate_merge(X : Tangle, h, e):
+    ''' The pair (change of len(X), change of X.get_n_crossings()) of the merge of
+    h and e, as merge_deltas, or None if the merge is not defined. X is not modified.
+    On a CompactTangle no plan is built: this is a single pass over the partner array.
+    '''
+    if _stats is not None: _stats.count("merges_attempted")
+    new_edges = merged_edges(h, e)
+    if new_edges is None: return None
+
+    if isinstance(X, CompactTangle):
+        return _compact_merge_deltas(X, h, e, *new_edges)
+    return merge_deltas(X, h, e, _merge_plan(X, h, e))
+
+def apply_merge(X : Tangle, h, e, plan):
+    if _stats is not None: _stats.count("merges_accepted")
+    e1, e2, n1, n2, changes = plan
+    merge(X, h, e)
+    for d, k in changes.items():
+        if k != 0:
+            X.set_n_crossings(d, X.get_n_crossings(d) + k)
+    X.set_n_crossings(e1, n1)
+    X.set_n_crossings(e2, n2)
+
+def merge_incremental(X : Tangle, h, e):
+    ''' Same as merge, but also keeps the crossing numbers of X up to date.
+    Only the edges crossing h, e and the two new edges are touched, so the
+    cost is O(N) instead of a rescan of all pairs of edges.
+    '''
+    plan = merge_plan(X, h, e)
+    if plan is None: return None
+    apply_merge(X, h, e, plan)
+
+    return plan[0], plan[1]
     
 def compose_with_T(i, X : Tangle):
+    if _stats is not None: _stats.count("compose_with_T")
     a = X.get_edge_from(i)
     b = X.get_edge_from(i+1)
 
-    n_crossings_a = X.n_crossings[a]
-    n_crossings_b = X.n_crossings[b]
+    n_crossings_a = X.get_n_crossings(a)
+    n_crossings_b = X.get_n_crossings(b)
 
     X.delete_edge(a)
     X.delete_edge(b)
@@ -188,8 +910,8 @@ def compose_with_T(i, X : Tangle):
     X.add_edge(a)
     X.add_edge(b)
 
-    X.n_crossings[a] = n_crossings_a
-    X.n_crossings[b] = n_crossings_b
+    X.set_n_crossings(a, n_crossings_a)
+    X.set_n_crossings(b, n_crossings_b)
 
 
 
@@ -256,86 +978,409 @@ def tau(X : Tangle):
     for x,y in polarity_labels.values():
         Z.append((x,y))
     
-    return Tangle(Z)
+    return type(X)(Z)
 
-def factorizeSN(X : Tangle):
+def bubble_sort_word(s):
+    ''' Indices i of the transpositions (i, i+1) performed by a bubble sort of s,
+    computed without sorting in O(N log N + length of the word).
+
+    Every pass of the bubble sort moves one position to the left each element that
+    has a larger element before it, and removes exactly one such larger element.
+    An element at position q (0-based) with c larger elements before it therefore
+    takes part in the first c passes, and in the pass t it is swapped with index
+    q - t + 1. Inside a pass the swaps are in increasing order of position.
+    '''
+    values = {v : k for k, v in enumerate(sorted(set(s)))}
+    smaller_or_equal = FenwickTree(len(values))
+    inversions = []
+    for q, v in enumerate(s):
+        inversions.append(q - smaller_or_equal.prefix_sum(values[v] + 1))
+        smaller_or_equal.add(values[v])
+
+    word = []
+    active = [q for q in range(len(s)) if inversions[q] > 0]
+    t = 1
+    while len(active) > 0:
+        for q in active:
+            word.append(q - t + 1)
+        t += 1
+        active = [q for q in active if inversions[q] >= t]
+
+    return word
+
+def _sn_indices(X : Tangle):
+  # the indices i of the factors T_i of factorizeSN(X)
   s = [-X.get_edge_from(i)[1] for i in range(1, X.N+1)]
+  return bubble_sort_word(s)
+
+def factorizeSN(X : Tangle, as_word = False):
+  I = _sn_indices(X)
+  if as_word: return array("h", [-i for i in I])
+
+  return [f"T{i}" for i in I]
 
-  F = []
-  for j in range(X.N-1, 0, -1):
-    for i in range(0, j):
-      if s[i] > s[i+1]:
-        s[i], s[i+1] = s[i+1], s[i]
-        F.append(f"T{i+1}")
+class _SlotTree:
+    ''' Slots 1, ..., n holding an edge and a value each, with the maximum value of
+    every range kept in a segment tree, so that the edges of a range of slots with
+    value >= t can be listed in slot order in O((k+1) log n) for k edges.
+    '''
+    EMPTY = -(1 << 30)
 
-  return F
+    def __init__(self, n):
+        self.size = 1 << max(n, 1).bit_length()
+        self.tree = [self.EMPTY] * (2*self.size)
+        self.edges = [None] * (n + 1)
 
-def factorizeBN(X : Tangle, minimize_Ts = False):
-    n = len(X.inv)
-    I = [int(f[1:]) for f in factorizeSN(tau(X))]
-    if len(I) == 0: return ["I"]
+    def set(self, slot, edge, value):
+        self.edges[slot] = edge
+        tree = self.tree
+        k = self.size + slot
+        tree[k] = value
+        k >>= 1
+        while k > 0:
+            tree[k] = max(tree[2*k], tree[2*k+1])
+            k >>= 1
+
+    def clear(self, slot, edge):
+        # only if the slot still holds edge
+        if self.edges[slot] == edge:
+            self.set(slot, None, self.EMPTY)
+
+    def at_least(self, lo, hi, t):
+        ''' Yields the edges of the slots lo, ..., hi with value >= t, in slot order.
+        '''
+        tree = self.tree
+        size = self.size
+        stack = [(1, 0, size - 1)]
+        while stack:
+            k, a, b = stack.pop()
+            if b < lo or a > hi or tree[k] < t: continue
+            if k >= size:
+                yield self.edges[a]
+                continue
+            m = (a + b) // 2
+            stack.append((2*k+1, m+1, b))
+            stack.append((2*k, a, m))
+
+class MergeIndex:
+    ''' Index of the edges of X that can take part in a length-decreasing merge.
+
+    An edge with at least as many crossings as its size is never merged by
+    factorizeBN, so only the other ones are indexed. They are kept in three
+    buckets, by the conditions of merged_edges for a hook (i, i+1) of X:
+        upper hooks (x, y) and negative transversals (x, -y), slot x and value y:
+        mergeable when x < i and y >= i+1 \n
+        positive transversals (x, -y), slot x and value -y: mergeable when x >= i+2 and y <= i \n
+        lower hooks (-x, -y), x < y, slot N+1-y: mergeable when y >= i+1
+    Inside a bucket the slots are in the order of the partner array of CompactTangle,
+    and the buckets follow each other in that order too. The index must be told
+    which edges were removed or changed (discard and update) after every
+    modification of X.
+    '''
+
+    def __init__(self, X : Tangle):
+        self.X = X
+        N = X.N
+        self.spanning = _SlotTree(N)
+        self.positive = _SlotTree(N)
+        self.lower = _SlotTree(N)
+        self.update(X.inv)
+
+    def _bucket(self, edge):
+        # (bucket, slot, value) of an edge, None for the zero transversals
+        x, y = edge
+        if x < 0: return self.lower, self.X.N + 1 + y, 0
+        if y > 0 or x < -y: return self.spanning, x, abs(y)
+        if x > -y: return self.positive, x, y
+        return None
+
+    def update(self, edges):
+        for edge in edges:
+            where = self._bucket(edge)
+            if where is None: continue
+            bucket, slot, value = where
+            if self.X.get_n_crossings(edge) < size(edge):
+                bucket.set(slot, edge, value)
+            else:
+                bucket.clear(slot, edge)
+
+    def discard(self, edges):
+        for edge in edges:
+            where = self._bucket(edge)
+            if where is not None:
+                where[0].clear(where[1], edge)
+
+    def candidates(self, h):
+        ''' Yields the edges that can be merged with the hook h, an edge of X, in the
+        order of the partner array of CompactTangle. X must not be modified before
+        the iteration is over.
+        '''
+        i = h[0]
+        N = self.X.N
+        yield from self.spanning.at_least(1, i-1, i+1)
+        yield from self.positive.at_least(i+2, N, -i)
+        yield from self.lower.at_least(1, N-i, 0)
+
+def factorizeBN(X : Tangle, minimize_Ts = False, as_word = False):
+    ''' Factorizes X, which is left untouched.
+
+    All the steps are performed on a single CompactTangle scratch copy of X.
+    The merges of a U step are taken from a MergeIndex and evaluated with
+    evaluate_merge without modifying the scratch, and only the chosen one is
+    planned and applied. The candidates are tried in index order.
+    '''
+    stats = _stats
+    if stats is not None:
+        stats.count("factorizations")
+        start = perf_counter()
+
+    n = X.N
+    tau_X = tau(X)
+    if stats is not None:
+        stats.time("tau", perf_counter() - start)
+        start = perf_counter()
+
+    I = _sn_indices(tau_X)
+    if stats is not None:
+        stats.time("SN", perf_counter() - start)
+        start = perf_counter()
+
+    S = X.copy() if isinstance(X, CompactTangle) else CompactTangle.from_tangle(X)
+    index = MergeIndex(S)
+    if stats is not None:
+        stats.time("setup", perf_counter() - start)
     
-    F = []
+    F = array("h")
     for i in I:
+        if stats is not None: start = perf_counter()
         h = (i,i+1)
-        if h in X:
-            l = len(X)
-            if minimize_Ts:
-                min_X = (n*(n-1)//2 + 1, None)
-            for edge in X.inv:
-                if edge == h: continue
-                if X.n_crossings[edge] >= size(edge): continue
-                
-                X_new = X.copy()
-                for d in X_new.inv:
-                    if d == h or d == edge: continue
-
-                    if X_new.are_intersecting_edges(d,edge):
-                        X_new.n_crossings[d] -= 1
-                
-                new_edges = merge(X_new, h, edge)
-                if new_edges is None: continue # merge is not defined
-
-                e1,e2 = new_edges
-                
-                for d in X_new.inv:
-                    if d == e1: continue
-                    if X_new.are_intersecting_edges(d,e1):
-                        X_new.n_crossings[e1] += 1
-                        X_new.n_crossings[d] += 1
-                
-                for d in X_new.inv:
-                    if d == e2: continue
-                    if X_new.are_intersecting_edges(d,e2):
-                        X_new.n_crossings[e2] += 1
-                        X_new.n_crossings[d] += 1
-                
-                l_new = len(X_new)
-                if l_new == l - 1:
-                    if minimize_Ts:
-                        nc = X_new.get_n_crossings()
-                        if nc < min_X[0]:
-                            min_X = (nc, X_new)
-                    else:
+        if h in S:
+            min_nc = n*(n-1)//2 + 1
+            best = None
+            for edge in index.candidates(h):
+                dl, dc = evaluate_merge(S, h, edge)
+                if dl == -1:
+                    if not minimize_Ts:
+                        best = edge
                         break
+                    if dc < min_nc:
+                        min_nc, best = dc, edge
             
-            F.append(f"U{i}")
-            if minimize_Ts:
-                X = min_X[1]
-            else:
-                X = X_new
+            if best is not None:
+                edge = best
+                plan = _merge_plan(S, h, edge)
+                apply_merge(S, h, edge, plan)
+                index.discard((h, edge))
+                index.update(plan[4])
+                index.update(plan[:2])
+            F.append(i)
+            if stats is not None: stats.time("U", perf_counter() - start)
 
         else:
-            compose_with_T(i, X)
-            F.append(f"T{i}")
-            e1 = X.get_edge_from(i)
-            e2 = X.get_edge_from(i+1)
-            X.n_crossings[e1] -= 1
-            X.n_crossings[e2] -= 1
+            index.discard((S.get_edge_from(i), S.get_edge_from(i+1)))
+            compose_with_T(i, S)
+            F.append(-i)
+            e1 = S.get_edge_from(i)
+            e2 = S.get_edge_from(i+1)
+            S.set_n_crossings(e1, S.get_n_crossings(e1) - 1)
+            S.set_n_crossings(e2, S.get_n_crossings(e2) - 1)
+            index.update((e1, e2))
+            if stats is not None: stats.time("T", perf_counter() - start)
     
-    return F
+    if as_word: return F
+
+    return word_to_names(F)
         
 
+def components(X):
+    ''' Splits X into its blocks: the strands i and i+1 are in different blocks when
+    no edge of X spans the gap between them. Returns the list of pairs (offset, partner)
+    of the blocks from left to right, where partner is the partner array (in the layout
+    of CompactTangle) of the block with the strands offset+1, offset+2, ... renumbered
+    from 1.
+    '''
+    partner = partner_array(X)
+    N = len(partner) // 2
+    strand = lambda a: a + 1 if a < N else 2*N - a
+
+    # cover[i] - cover[i-1] is the number of edges that start or stop spanning the gap i
+    cover = [0] * (N + 1)
+    for a, b in enumerate(partner):
+        if a < b:
+            x, y = strand(a), strand(b)
+            cover[min(x, y)] += 1
+            cover[max(x, y)] -= 1
+
+    blocks = []
+    start = 0
+    spanning = 0
+    for i in range(1, N + 1):
+        spanning += cover[i]
+        if spanning > 0: continue
+
+        M = i - start
+        index = lambda a: a - start if a < N else 2*M - (2*N - a - start)
+        block = array("h", [0]) * (2*M)
+        for a in chain(range(start, i), range(2*N - i, 2*N - start)):
+            block[index(a)] = index(partner[a])
+        blocks.append((start, block))
+        start = i
+
+    return blocks
+
+def shift_word(word, offset):
+    ''' The word with the factors U_i and T_i replaced by U_(i+offset) and T_(i+offset).
+    '''
+    return array("h", [code + offset if code > 0 else code - offset for code in word])
+
+def _factorize_block(partner, minimize_Ts):
+    return factorizeBN(CompactTangle.from_partner(partner), minimize_Ts, as_word = True)
+
+def factorizeBN_components(X : Tangle, minimize_Ts = False, as_word = False, cache = None, mapper = map):
+    ''' Factorizes X block by block (see components) and concatenates the words of the
+    blocks, shifted to their strands. The blocks act on disjoint strands, so the result
+    is a factorization of X, with length len(X) as the lengths of the blocks add up. \n
+    Arguments:
+        cache : a FactorizationCache for the blocks, shared with its factorizeBN \n
+        mapper : a function like map, used to factorize the blocks that are not cached,
+        for example the map of a multiprocessing.Pool to factorize them in parallel
+
+    Equal blocks are factorized once, and the strands that are not connected to any
+    other (i to -i) are skipped.
+    '''
+    blocks = [(offset, block) for offset, block in components(X) if len(block) > 2]
+    if len(blocks) == 1 and blocks[0][0] == 0 and cache is None:
+        return factorizeBN(X, minimize_Ts, as_word)
+
+    # the words of the distinct blocks, by the bytes of their partner arrays
+    words = {}
+    pending = []
+    for _, block in blocks:
+        key = block.tobytes()
+        if key in words: continue
+        words[key] = cache.get_word(block, minimize_Ts) if cache is not None else None
+        if words[key] is None:
+            pending.append(block)
+
+    results = mapper(partial(_factorize_block, minimize_Ts = minimize_Ts), pending)
+    for block, word in zip(pending, results):
+        words[block.tobytes()] = word
+        if cache is not None:
+            cache.put_word(block, minimize_Ts, word)
+
+    F = array("h")
+    for offset, block in blocks:
+        F.extend(shift_word(words[block.tobytes()], offset))
+    
+    if as_word: return F
+
+    return word_to_names(F)
+
+def partner_array(X):
+    ''' Partner array of X (a Tangle, a CompactTangle or already a partner array or
+    list) in the layout of CompactTangle, as an array of type "h".
+    '''
+    if isinstance(X, CompactTangle):
+        return array("h", X.partner)
+    if not hasattr(X, "inv"):
+        return array("h", X)
+    
+    return array("h", diagram_to_involution(X.inv, X.N))
+
+def canonical_key(X):
+    ''' Hashable encoding of the diagram of X (a Tangle or a CompactTangle): the bytes
+    of its partner array in the layout of CompactTangle. Equal diagrams have equal
+    keys whatever the representation and the orientation of the edges.
+    '''
+    return partner_array(X).tobytes()
+
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "evictions", "size", "maxsize"])
+
+class FactorizationCache:
+    ''' Bounded cache for factorizeBN and factorizeSN, keyed by canonical_key. \n
+    Arguments:
+        maxsize : maximum number of stored factorizations, None for no bound \n
+        policy : "lru" evicts the least recently used entry, "fifo" the oldest one
+
+    The words are stored as immutable bytes, so neither mutating the input
+    afterwards nor mutating a returned factorization can corrupt the cache.
+    '''
+
+    def __init__(self, maxsize = 2**16, policy = "lru"):
+        if policy not in ("lru", "fifo"):
+            raise ValueError(f"unknown eviction policy {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        word = self.data.get(key)
+        if word is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == "lru":
+            self.data.move_to_end(key)
+        return word
+
+    def _put(self, key, word):
+        self.data[key] = word
+        if self.maxsize is not None and len(self.data) > self.maxsize:
+            self.data.popitem(last = False)
+            self.evictions += 1
+
+    def _lookup(self, key, factorize):
+        word = self._get(key)
+        if word is None:
+            word = factorize().tobytes()
+            self._put(key, word)
+        return array("h", word)
+
+    @staticmethod
+    def key(X, minimize_Ts = False):
+        ''' Key of the factorizeBN entry of X (a tangle or a partner array).
+        '''
+        return (canonical_key(X), "BN", minimize_Ts)
+
+    def get_word(self, X, minimize_Ts = False):
+        ''' The cached factorizeBN word of X, or None. Counts as a hit or a miss.
+        '''
+        word = self._get(self.key(X, minimize_Ts))
+        if word is None: return None
+
+        return array("h", word)
+
+    def put_word(self, X, minimize_Ts, word):
+        ''' Stores word (factor codes) as the factorizeBN word of X.
+        '''
+        self._put(self.key(X, minimize_Ts), array("h", word).tobytes())
+
+    def factorizeBN(self, X : Tangle, minimize_Ts = False, as_word = False):
+        key = self.key(X, minimize_Ts)
+        F = self._lookup(key, lambda: factorizeBN(X, minimize_Ts, as_word = True))
+        if as_word: return F
+
+        return word_to_names(F)
+
+    def factorizeSN(self, X : Tangle, as_word = False):
+        key = (canonical_key(X), "SN")
+        F = self._lookup(key, lambda: factorizeSN(X, as_word = True))
+        if as_word: return F
+
+        return [factor_name(code) for code in F]
+
+    def stats(self):
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.data), self.maxsize)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
 if __name__ == "__main__":
 
     X = text_to_tangle("1:4,2:4',3:5,6:1',2':3',5':6'")
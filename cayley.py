@@ -0,0 +1,129 @@
+#walks the Cayley Graph of Bn without SageMath and stores, for every tangle,
+#the last factor of a minimal factorization and the tangle it was reached from
+#usage: python cayley.py n
+#writes BN/b{n}.fdb (see factorization_db.py). Suggestion: use PyPy for performance improvements
+#
+#the tangles are partner arrays in the layout of CompactTangle and are identified by
+#pmatch.rank_involution, so the visited set, the parent pointers and the BFS queue are
+#flat arrays indexed by rank. The walk visits the generators in the same order as
+#bfs_cayley.py (U_1, ..., U_{n-1}, T_1, ..., T_{n-1}) and gives the same factorizations
+
+import os
+from array import array
+from sys import argv
+
+from brauermonoid import apply_factor, factor_name
+from pmatch import number_of_matchings, rank_diagram, rank_involution, unrank_involution
+
+def generator_codes(n):
+    return list(range(1, n)) + list(range(-1, -n, -1))
+
+def identity(n):
+    partner = [0 for _ in range(2*n)]
+    for i in range(n):
+        partner[i] = 2*n - 1 - i
+        partner[2*n - 1 - i] = i
+    return partner
+
+def _rank_typecode(count):
+    # 4 bytes per rank when possible, the largest value is reserved for unvisited tangles
+    return "I" if count < 2**32 - 1 else "Q"
+
+class CayleyTable:
+    ''' Parent-pointer table of a breadth-first walk of the Cayley graph of B_n.
+    For every rank r, gens[r] is the code of the last factor of the factorization
+    of the tangle (see brauermonoid.factor_code) and parents[r] the rank of the
+    tangle it was reached from. Factorizations are rebuilt on demand by following
+    the parents up to the identity.
+    '''
+
+    def __init__(self, n):
+        self.n = n
+        self.count = number_of_matchings(n)
+        typecode = _rank_typecode(self.count)
+        self.unvisited = 2**(8 * array(typecode).itemsize) - 1
+        self.parents = array(typecode, [self.unvisited]) * self.count
+        self.gens = array("b", [0]) * self.count
+        self.root = rank_involution(identity(n))
+        self.parents[self.root] = self.root
+
+    def _rank(self, key):
+        if isinstance(key, int): return key
+        return rank_diagram(key)
+
+    def __contains__(self, key):
+        return self.parents[self._rank(key)] != self.unvisited
+
+    def visit(self, r, parent, code):
+        ''' Records that the tangle r is reached from parent with the factor code,
+        unless r was already visited. Returns True if r is new.
+        '''
+        if self.parents[r] != self.unvisited: return False
+        self.parents[r] = parent
+        self.gens[r] = code
+        return True
+
+    def codes(self, key):
+        r = self._rank(key)
+        if self.parents[r] == self.unvisited:
+            raise KeyError(key)
+        codes = array("h")
+        while r != self.root:
+            codes.append(self.gens[r])
+            r = self.parents[r]
+        codes.reverse()
+        return codes
+
+    def factorization(self, key):
+        return [factor_name(c) for c in self.codes(key)]
+
+    def __getitem__(self, key):
+        return self.factorization(key)
+
+    def items(self):
+        ''' Streams the pairs (rank, factorization) in rank order, rebuilding one
+        factorization at a time.
+        '''
+        for r in range(self.count):
+            if self.parents[r] != self.unvisited:
+                yield r, self.factorization(r)
+
+def bfs(n, progress = None):
+    ''' Breadth-first walk of the Cayley graph of B_n from the identity.
+    progress, if given, is called with the number of tangles expanded so far.
+    '''
+    table = CayleyTable(n)
+    codes = generator_codes(n)
+
+    # every tangle enters the queue once, so the queue is the array of ranks in discovery order
+    queue = array(table.parents.typecode, [table.root])
+    head = 0
+    while head < len(queue):
+        r = queue[head]
+        head += 1
+        tangle = unrank_involution(n, r)
+
+        for code in codes:
+            neigh = tangle[:]
+            apply_factor(neigh, code)
+            r_neigh = rank_involution(neigh)
+            if table.visit(r_neigh, r, code):
+                queue.append(r_neigh)
+
+        if progress is not None:
+            progress(head)
+
+    return table
+
+if __name__ == "__main__":
+    from tqdm import tqdm
+    from factorization_db import write_db
+
+    _, n = argv
+    n = int(n)
+
+    with tqdm(total = number_of_matchings(n)) as pbar:
+        table = bfs(n, progress = lambda _: pbar.update(1))
+
+    os.makedirs("BN", exist_ok = True)
+    write_db(f"BN/b{n}.fdb", n, table.items())
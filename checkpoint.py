@@ -0,0 +1,65 @@
+#periodic and atomic checkpoints for the long enumeration scripts
+
+import os
+import pickle as pkl
+import time
+
+def save_checkpoint(path, state):
+    ''' Writes state to path atomically: the data is written to a temporary file
+    in the same directory, flushed to disk and then renamed over path, so that
+    a process killed at any time leaves either the old or the new checkpoint.
+    '''
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pkl.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    ''' Returns the state saved in path, or None if there is no checkpoint.
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pkl.load(f)
+
+class Checkpointer:
+    ''' Saves a checkpoint at most once every `every` seconds. \n
+    Arguments:
+        path : the checkpoint file, None disables checkpointing \n
+        every : minimum number of seconds between two checkpoints
+    '''
+
+    def __init__(self, path, every = 60):
+        self.path = path
+        self.every = every
+        self.last_save = time.monotonic()
+
+    def load(self):
+        if self.path is None: return None
+        return load_checkpoint(self.path)
+
+    def save(self, state):
+        if self.path is None: return
+        save_checkpoint(self.path, state)
+        self.last_save = time.monotonic()
+
+    def maybe_save(self, get_state):
+        # get_state is only called when a checkpoint is due
+        if self.path is None: return
+        if time.monotonic() - self.last_save >= self.every:
+            self.save(get_state())
+
+def checkpoint_arguments(parser):
+    ''' Adds the --checkpoint, --checkpoint-every and --resume options to an argparse parser.
+    '''
+    parser.add_argument("--checkpoint", default = None, help = "checkpoint file (default: none, or an automatic name with --resume)")
+    parser.add_argument("--checkpoint-every", type = float, default = 60, help = "seconds between two checkpoints")
+    parser.add_argument("--resume", action = "store_true", help = "resume from the checkpoint file if it exists")
+
+def checkpoint_path(args, name):
+    # the default checkpoint file is only used when resuming is requested
+    if args.checkpoint is not None: return args.checkpoint
+    if args.resume: return name
+    return None
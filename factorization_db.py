@@ -0,0 +1,187 @@
+#compact on-disk database of the factorizations of all the tangles of B_n
+#usage: python factorization_db.py BN/b8.pkl BN/b8.fdb
+#converts a pickled dictionary diagram:factorization (as written by bfs_cayley.py) to the binary format
+#
+#the file starts with a 24 bytes header (magic, version, n, width, number of records,
+#number of records present) followed by one fixed-width record per diagram, stored at the position given by
+#pmatch.rank_diagram. A record is one byte with the number of factors (255 if the
+#diagram is missing) followed by width signed bytes with the factors, where U_i is
+#stored as i and T_i as -i (see brauermonoid.factor_code). The files of version 1 have a
+#16 bytes header without the number of records present, and can still be read
+
+import mmap
+import os
+import pickle as pkl
+import struct
+from array import array
+from sys import argv
+
+from brauermonoid import factor_name, word_from_names
+from pmatch import number_of_matchings, rank_diagram, unrank_diagram
+
+MAGIC = b"BMFD"
+VERSION = 2
+HEADER = struct.Struct("<4sBBHQQ")
+HEADER_V1 = struct.Struct("<4sBBHQ")
+MISSING = 255
+
+def default_width(n):
+    return n*(n-1)//2
+
+def _rank(key):
+    if isinstance(key, int): return key
+    return rank_diagram(key)
+
+class FactorizationDBWriter:
+    ''' Writes a database for B_n. The file is preallocated with all the records
+    marked as missing, so the factorizations can be added in any order. \n
+    Arguments:
+        path : the output file \n
+        n : number of strands \n
+        width : maximum number of factors of a factorization (default: n(n-1)/2)
+    '''
+
+    def __init__(self, path, n, width = None):
+        self.n = n
+        self.width = default_width(n) if width is None else width
+        self.count = number_of_matchings(n)
+        if self.width >= MISSING or n > 127:
+            raise ValueError("the database supports at most 254 factors and 127 strands")
+        self.record_size = self.width + 1
+        self.present = 0
+
+        self.f = open(path, "wb+")
+        self.f.write(self._header())
+        empty = bytes([MISSING]) + bytes(self.width)
+        block = 1 << 12
+        for i in range(0, self.count, block):
+            self.f.write(empty * min(block, self.count - i))
+
+    def put(self, key, factorization):
+        ''' key is a rank or a diagram given as pairs of nodes, factorization
+        a list of factor names or of factor codes.
+        '''
+        codes = word_from_names(factorization)
+        if len(codes) > self.width:
+            raise ValueError(f"factorization with {len(codes)} factors, the width is {self.width}")
+        record = bytes([len(codes)]) + array("b", codes).tobytes() + bytes(self.width - len(codes))
+        self.f.seek(HEADER.size + _rank(key) * self.record_size)
+        if self.f.read(1)[0] == MISSING:
+            self.present += 1
+        self.f.seek(-1, os.SEEK_CUR)
+        self.f.write(record)
+
+    def _header(self):
+        return HEADER.pack(MAGIC, VERSION, self.n, self.width, self.count, self.present)
+
+    def close(self):
+        # the number of records present is only known at the end
+        self.f.seek(0)
+        self.f.write(self._header())
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_db(path, n, items, width = None):
+    ''' Writes the (diagram, factorization) pairs of items to a database for B_n.
+    '''
+    with FactorizationDBWriter(path, n, width) as writer:
+        for key, factorization in items:
+            writer.put(key, factorization)
+
+class FactorizationDB:
+    ''' Read-only, memory-mapped view of a database written by FactorizationDBWriter.
+    Only the header is read when opening the file, and every lookup reads a single
+    record. len() is read from the header (and counted once for files of version 1). Diagrams can be looked up by rank or by their pairs of nodes, and the
+    factorizations are returned as lists of factor names, as in the pickled dictionaries.
+    '''
+
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, version = HEADER_V1.unpack_from(self.mm, 0)[:2]
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"{path} is not a factorization database")
+        if version == 1:
+            _, _, self.n, self.width, self.count = HEADER_V1.unpack_from(self.mm, 0)
+            self.header_size = HEADER_V1.size
+            self.present = None
+        else:
+            _, _, self.n, self.width, self.count, self.present = HEADER.unpack_from(self.mm, 0)
+            self.header_size = HEADER.size
+        self.record_size = self.width + 1
+
+    def codes(self, key):
+        ''' Returns the factorization of key as an array of factor codes.
+        '''
+        r = _rank(key)
+        if not 0 <= r < self.count:
+            raise KeyError(key)
+        offset = self.header_size + r * self.record_size
+        length = self.mm[offset]
+        if length == MISSING:
+            raise KeyError(key)
+        return array("b", self.mm[offset + 1 : offset + 1 + length])
+
+    def __getitem__(self, key):
+        return [factor_name(c) for c in self.codes(key)]
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        r = _rank(key)
+        return 0 <= r < self.count and self.mm[self.header_size + r * self.record_size] != MISSING
+
+    def __len__(self):
+        if self.present is None:
+            self.present = sum(1 for _ in self.ranks())
+        return self.present
+
+    def ranks(self):
+        for r in range(self.count):
+            if self.mm[self.header_size + r * self.record_size] != MISSING:
+                yield r
+
+    def items(self):
+        ''' Yields the pairs (diagram, factorization), where the diagram is given in
+        the same format as the base_diagram() of SageMath.
+        '''
+        for r in self.ranks():
+            diagram = tuple(sorted(tuple(sorted(pair)) for pair in unrank_diagram(self.n, r)))
+            yield diagram, self[r]
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_factorizations(stem):
+    ''' Opens stem.fdb if it exists, otherwise unpickles stem.pkl. Both objects
+    support lookups by diagram and items().
+    '''
+    if os.path.exists(f"{stem}.fdb"):
+        return FactorizationDB(f"{stem}.fdb")
+    with open(f"{stem}.pkl", "rb") as f:
+        return pkl.load(f)
+
+if __name__ == "__main__":
+    _, pkl_path, db_path = argv
+
+    with open(pkl_path, "rb") as f:
+        bn = pkl.load(f)
+
+    n = len(next(iter(bn)))
+    write_db(db_path, n, bn.items())
@@ -0,0 +1,154 @@
+#factorizes many tangles at once using a pool of processes
+#usage: python factorize.py [input file] [--workers W] [--chunksize C] [--minimize-Ts] [-o output file]
+#the input contains one tangle per line in the format of text_to_tangle (stdin if omitted)
+#and the factorizations are written one per line, in the same order (stdout if omitted).
+#--input-format and --output-format select the other formats of tangle_io.py
+#with --split-components every tangle is factorized block by block (see factorizeBN_components)
+#with --verify FILE the factorizations in FILE (in --output-format) are checked against the
+#tangles of the input instead: the invalid ones are reported and the exit status is 1
+
+import argparse
+import os
+import sys
+from collections import deque
+from itertools import islice, zip_longest
+from multiprocessing import Pool
+
+from brauermonoid import CompactTangle, FactorizationCache, factorizeBN, factorizeBN_components, is_factorization
+from tangle_io import FORMATS, open_stream, parse_record, read_factorizations, read_records, write_factorizations
+
+# cache of the current process, see factorize_many
+_cache = None
+
+def _init_cache(cache_size):
+    global _cache
+    _cache = FactorizationCache(cache_size) if cache_size else None
+
+def _factorize_chunk(chunk, minimize_Ts, as_word, split_components = False):
+    F = []
+    for X in chunk:
+        if not hasattr(X, "inv"):
+            X = parse_record(X, CompactTangle)
+        if split_components:
+            F.append(factorizeBN_components(X, minimize_Ts, as_word, cache = _cache))
+        elif _cache is not None:
+            F.append(_cache.factorizeBN(X, minimize_Ts, as_word))
+        else:
+            F.append(factorizeBN(X, minimize_Ts, as_word))
+
+    return F
+
+def _chunks(iterable, chunksize):
+    iterable = iter(iterable)
+    while True:
+        chunk = list(islice(iterable, chunksize))
+        if len(chunk) == 0: return
+        yield chunk
+
+def _map_chunks(function, args, chunks, workers, initializer = None, initargs = ()):
+    # yields the results of function(chunk, *args) for every chunk, in order, keeping at
+    # most 2 * workers chunks pending
+    if workers <= 1:
+        if initializer is not None: initializer(*initargs)
+        for chunk in chunks:
+            yield from function(chunk, *args)
+        return
+
+    with Pool(workers, initializer = initializer, initargs = initargs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(function, (chunk,) + args))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().get()
+
+        while len(pending) > 0:
+            yield from pending.popleft().get()
+
+def factorize_many(tangles, workers = None, chunksize = 64, minimize_Ts = False, as_word = False, cache_size = None, split_components = False):
+    ''' Yields the factorization of every tangle, in the same order as the input. \n
+    Arguments:
+        tangles : iterable of Tangle/CompactTangle or of records of tangle_io.read_records \n
+        workers : number of processes (default: os.cpu_count()). With workers = 1 everything runs in the current process \n
+        chunksize : number of tangles sent to a worker at a time \n
+        minimize_Ts, as_word : passed to factorizeBN. Words are cheaper to send back from the workers \n
+        cache_size : if given, every process keeps a FactorizationCache of this size \n
+        split_components : factorize the blocks of every tangle separately, with factorizeBN_components.
+        The cache then stores the factorizations of the blocks
+
+    The input is consumed lazily: at most 2 * workers chunks are pending at
+    any time, so arbitrarily long streams can be factorized in bounded memory.
+    The input tangles are never modified.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    args = (minimize_Ts, as_word, split_components)
+    yield from _map_chunks(_factorize_chunk, args, _chunks(tangles, chunksize), workers, _init_cache, (cache_size,))
+
+def _verify_chunk(chunk):
+    ok = []
+    for X, F in chunk:
+        # one of the inputs is shorter than the other
+        if X is None or F is None:
+            ok.append(False)
+            continue
+        if not hasattr(X, "inv"):
+            X = parse_record(X, CompactTangle)
+        ok.append(is_factorization(X, F))
+
+    return ok
+
+def verify(tangles, factorizations, workers = None, chunksize = 256):
+    ''' Yields, for every tangle and its factorization, whether the product of the
+    factorization is the tangle and its length is len(tangle), in the same order as
+    the input (see brauermonoid.is_factorization). \n
+    Arguments:
+        tangles : iterable of Tangle/CompactTangle or of records of tangle_io.read_records \n
+        factorizations : iterable of lists of factor names or of words \n
+        workers, chunksize : as in factorize_many
+
+    Both inputs are consumed lazily. If one is longer than the other, its extra
+    items are reported as invalid, as are the factorizations with a factor that
+    is not in B_N.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    pairs = zip_longest(tangles, factorizations)
+    yield from _map_chunks(_verify_chunk, (), _chunks(pairs, chunksize), workers)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Factorize tangles given one per line in the text_to_tangle format.")
+    parser.add_argument("input", nargs = "?", default = "-", help = "input file (default: stdin)")
+    parser.add_argument("-o", "--output", default = "-", help = "output file (default: stdout)")
+    parser.add_argument("--input-format", choices = FORMATS, default = "text", help = "format of the tangles, see tangle_io.py")
+    parser.add_argument("--output-format", choices = FORMATS, default = "text", help = "format of the factorizations, see tangle_io.py")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of processes (default: number of cores)")
+    parser.add_argument("-c", "--chunksize", type = int, default = 64, help = "tangles sent to a worker at a time")
+    parser.add_argument("--minimize-Ts", action = "store_true", help = "use the factorization with the least T-primes")
+    parser.add_argument("--cache-size", type = int, default = None, help = "cache this many factorizations in every process")
+    parser.add_argument("--split-components", action = "store_true", help = "factorize the blocks of every tangle separately")
+    parser.add_argument("--verify", default = None, metavar = "FACTORIZATIONS", help = "check the factorizations in this file (in --output-format) instead of factorizing")
+    args = parser.parse_args(argv)
+
+    if args.verify is not None:
+        with open_stream(args.input, "r", args.input_format) as f, open_stream(args.verify, "r", args.output_format) as g:
+            records = read_records(f, args.input_format)
+            # the names are checked by the workers, so a bad factor is reported as invalid
+            factorizations = read_factorizations(g, args.output_format, names = True)
+            invalid = 0
+            for k, ok in enumerate(verify(records, factorizations, args.workers, args.chunksize)):
+                if not ok:
+                    invalid += 1
+                    print(f"invalid factorization of tangle {k}", file = sys.stderr)
+        print(f"{invalid} invalid factorizations", file = sys.stderr)
+        return 1 if invalid > 0 else 0
+
+    # the records are parsed by the workers, and both files are streamed
+    with open_stream(args.input, "r", args.input_format) as f, open_stream(args.output, "w", args.output_format) as out:
+        records = read_records(f, args.input_format)
+        factorizations = factorize_many(records, args.workers, args.chunksize, args.minimize_Ts, as_word = True, cache_size = args.cache_size, split_components = args.split_components)
+        write_factorizations(out, factorizations, args.output_format)
+
+if __name__ == "__main__":
+    sys.exit(main())
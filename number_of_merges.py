@@ -1,7 +1,16 @@
 #Suggestion: use PyPy for performance improvements
+#usage: python number_of_merges.py [--n N] [--shard i/k] [--workers W]
+#with --shard i/k only the i-th of k disjoint slices of B_n is enumerated (0 <= i < k)
+#with --resume the enumeration is periodically checkpointed to a file (see --checkpoint)
+#and restarted from the last checkpoint if the file already exists
+#the number of possible merges does not change when a tangle is mirrored (i -> n+1-i), so
+#only one tangle of every pair is measured; --no-symmetry measures all of them
 
-from pmatch import brauer_diagrams
+import argparse
+from multiprocessing import Pool
+from pmatch import brauer_diagram_orbit, brauer_diagrams_prefix, brauer_diagrams_prefix_orbits, number_of_prefixes, parse_shard, shard_bounds
 from brauermonoid import *
+from checkpoint import Checkpointer, checkpoint_arguments, checkpoint_path
 from tqdm import tqdm
 
 def get_hooks_of_size_one(b):
@@ -24,61 +33,125 @@ def double_fact(N):
     return 1
   return double_fact(N-2) * N
 
-for n in range(3,12):
-    print(n)
-    size_bn = double_fact(2*n - 1)
+def max_merges(b):
+    hs = get_hooks_of_size_one(b)
+    if len(hs) == 0: return None, None
 
-    max_found = [-1, set()]
+    inv = [normalize(t) for t in b]
+
+    t = Tangle(inv)
+    l = len(t)
+    max_merges_of_t = -1
+    for h in hs:
+        h = normalize(h)
+
+        n_possible_merges_of_h = 0
+
+        for edge in t.inv:
+            if edge == h: continue
+            plan = merge_plan(t, h, edge)
+            if plan is None: continue # merge is not defined
 
-    for b in tqdm(brauer_diagrams(n), total = size_bn):
+            if merge_deltas(t, h, edge, plan)[0] == -1:
+                n_possible_merges_of_h += 1
         
-        hs = get_hooks_of_size_one(b)
-        if len(hs) == 0: continue
-
-        inv = [normalize(t) for t in b]
-
-        t = Tangle(inv)
-        l = len(t)
-        max_merges_of_t = -1
-        for h in hs:
-            h = normalize(h)
-
-            n_possible_merges_of_h = 0
-
-            for edge in t.inv:
-                if edge == h: continue
-                _t = t.copy()
-                new_edges = merge(_t, h, edge)
-                if new_edges is None: continue # merge is not defined
-
-                e1,e2 = new_edges
-
-                for d in _t.inv:
-                    if d == e1: continue
-                    if _t.are_intersecting_edges(d,e1):
-                        _t.n_crossings[e1] += 1
-                        _t.n_crossings[d] += 1
-                
-                for d in _t.inv:
-                    if d == e2: continue
-                    if _t.are_intersecting_edges(d,e2):
-                        _t.n_crossings[e2] += 1
-                        _t.n_crossings[d] += 1
-                
-                l_new = len(_t)
-                if l == l_new + 1:
-                    n_possible_merges_of_h += 1
-            
-            if max_merges_of_t < n_possible_merges_of_h:
-                max_merges_of_t = n_possible_merges_of_h
-            
-        if max_found[0] == max_merges_of_t:
-            max_found[1].add(str(inv))
-        elif max_found[0] < max_merges_of_t:
-            max_found = [max_merges_of_t, {str(inv)}]
-
-    n_max_merges = max_found[0]
-    print(f"There are {len(max_found[1])} tangles with {max_found[0]} possible merges.")
+        if max_merges_of_t < n_possible_merges_of_h:
+            max_merges_of_t = n_possible_merges_of_h
+    
+    return max_merges_of_t, inv
+
+def update_max_found(max_found, max_merges_of_t, tangles):
+    if max_found[0] == max_merges_of_t:
+        max_found[1].update(tangles)
+    elif max_found[0] < max_merges_of_t:
+        max_found[0] = max_merges_of_t
+        max_found[1] = set(tangles)
+
+def max_merges_prefix(args):
+    n, prefix, symmetry = args
+    max_found = [-1, set()]
+    n_tangles = 0
+
+    if not symmetry:
+        for b in brauer_diagrams_prefix(n, prefix):
+            n_tangles += 1
+            max_merges_of_t, inv = max_merges(b)
+            if inv is None: continue
+
+            update_max_found(max_found, max_merges_of_t, [str(inv)])
+
+        return max_found, n_tangles
+
+    # the mirror images of b have the same number of possible merges
+    for b, orbit_size in brauer_diagrams_prefix_orbits(n, prefix, ("mirror",)):
+        n_tangles += orbit_size
+        max_merges_of_t, inv = max_merges(b)
+        if inv is None or max_merges_of_t < max_found[0]: continue
+
+        orbit = brauer_diagram_orbit(b, n, ("mirror",))
+        update_max_found(max_found, max_merges_of_t, [str([normalize(t) for t in c]) for c in orbit])
+
+    return max_found, n_tangles
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type = int, default = None, help = "size of the tangles (default: from 3 to 11)")
+    parser.add_argument("--shard", type = parse_shard, default = (0, 1), help = "enumerate only the slice i/k of B_n")
+    parser.add_argument("--workers", type = int, default = 1, help = "number of processes")
+    parser.add_argument("--no-symmetry", action = "store_true", help = "measure every tangle instead of one per mirror pair")
+    checkpoint_arguments(parser)
+    args = parser.parse_args()
+
+    shard, n_shards = args.shard
+    pool = Pool(args.workers) if args.workers > 1 else None
+
+    path = checkpoint_path(args, f"number_of_merges_{shard}of{n_shards}.ckpt")
+    checkpointer = Checkpointer(path, args.checkpoint_every)
+    state = checkpointer.load() if args.resume else None
+    if state is not None and state["shard"] != (shard, n_shards):
+        raise ValueError(f"{path} is the checkpoint of a different enumeration")
+    if state is None:
+        state = {"shard" : (shard, n_shards), "completed" : {}, "n" : None}
+
+    for n in ([args.n] if args.n is not None else range(3,12)):
+        print(n)
+        size_bn = double_fact(2*n - 1)
+
+        lo, hi = shard_bounds(n, shard, n_shards)
+
+        if n in state["completed"]:
+            max_found = state["completed"][n]
+        else:
+            if state["n"] == n:
+                print(f"Resuming from {path} at prefix {state['next_prefix']} of [{lo}, {hi})")
+            else:
+                state.update({"n" : n, "next_prefix" : lo, "n_tangles" : 0, "max_found" : [-1, set()]})
+            max_found = state["max_found"]
+
+            tasks = [(n, prefix, not args.no_symmetry) for prefix in range(state["next_prefix"], hi)]
+            results = pool.imap(max_merges_prefix, tasks, chunksize = 16) if pool else map(max_merges_prefix, tasks)
+
+            with tqdm(total = size_bn * (hi - lo) // number_of_prefixes(n), initial = state["n_tangles"]) as pbar:
+                for (max_merges_of_prefix, tangles), n_tangles in results:
+                    update_max_found(max_found, max_merges_of_prefix, tangles)
+                    state["next_prefix"] += 1
+                    state["n_tangles"] += n_tangles
+                    pbar.update(n_tangles)
+                    checkpointer.maybe_save(lambda: state)
+
+            state["completed"][n] = max_found
+            state["n"] = None
+            checkpointer.save(state)
+
+        n_max_merges = max_found[0]
+        print(f"There are {len(max_found[1])} tangles with {max_found[0]} possible merges.")
+
+    if pool:
+        pool.close()
+        pool.join()
+
+if __name__ == "__main__":
+    main()
 
 # 2
 # There are 1 tangles with 1 possible merges.
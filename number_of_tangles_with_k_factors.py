@@ -1,11 +1,24 @@
 #Suggestion: use PyPy for performance improvements
-
-
-import pickle as pkl
+#usage: python number_of_tangles_with_k_factors.py [--n N] [--shard i/k] [--workers W] [--numpy | --symmetry]
+#with --shard i/k only the i-th of k disjoint slices of B_n is enumerated (0 <= i < k),
+#so that the histograms of the k shards sum up to the ones of B_n
+#with --resume the enumeration is periodically checkpointed to a file (see --checkpoint)
+#and restarted from the last checkpoint if the file already exists
+#with --symmetry the length and the number of components are computed once per orbit of the
+#mirror (i -> n+1-i) and the flip (i <-> -i), which do not change them, and weighted by the size
+#of the orbit. The tangles are built one edge at a time and the branches that cannot lead to the
+#representative of an orbit are cut, so most of the other tangles are never built
+
+
+import argparse
+import os
+from multiprocessing import Pool
 from tqdm import tqdm
-from brauermonoid import Tangle
+from brauermonoid import ChordStatistics, PartnerStatistics
+from checkpoint import Checkpointer, checkpoint_arguments, checkpoint_path
+from factorization_db import load_factorizations
 
-from pmatch import brauer_diagrams
+from pmatch import number_of_prefixes, parse_shard, perfect_matchings_prefix_deltas, prefix_depth, prefix_matching, shard_bounds, symmetry_permutations, undecided_symmetries
 
 def n_components(inv):
     not_covered = set(range(1,len(inv)))
@@ -17,55 +30,174 @@ def n_components(inv):
     return len(not_covered) + 1
 
 
-def normalize(t):
-    x,y = sorted(t, key = lambda x : abs(x))
-    if x < 0 and y > 0:
-        x,y = y,x
-    
-    return (x,y)
-
 def double_fact(N):
   if N == 0 or N == 1:
     return 1
   return double_fact(N-2) * N
-        
-
-n = 8
-size_bn = double_fact(2*n - 1)
 
-print(n)
-
-one_component = [0 for _ in range(n*(n-1)//2 + 1)]
-all_tangles = [0 for _ in range(n*(n-1)//2 + 1)]
-
-if n <= 8:
-    with open(f"BN/b{n}.pkl", "rb") as f:
-        print(f"Loading BN/b{n}.pkl")
-        bn = pkl.load(f)
+def count_prefix(args):
+    # the statistics are updated along the enumeration, which changes two pairs at a time
+    n, prefix = args
+    one_component = [0 for _ in range(n*(n-1)//2 + 1)]
+    all_tangles = [0 for _ in range(n*(n-1)//2 + 1)]
+    n_tangles = 0
+
+    stats = None
+    for f, delta in perfect_matchings_prefix_deltas(n, prefix):
+        if delta is None:
+            stats = PartnerStatistics(f)
+        else:
+            stats.rewire(*delta)
+
+        l = len(stats)
+        all_tangles[l] += 1
+        if stats.n_components() == 1:
+            one_component[l] += 1
+        n_tangles += 1
+
+    return one_component, all_tangles, n_tangles
+
+def count_prefix_orbits(args):
+    # same as count_prefix, with one tangle per orbit of the symmetries weighted by the size
+    # of the orbit: the statistics are updated along a depth-first search that adds one edge
+    # at a time, and a branch is left as soon as it cannot lead to a representative
+    n, prefix = args
+    one_component = [0 for _ in range(n*(n-1)//2 + 1)]
+    all_tangles = [0 for _ in range(n*(n-1)//2 + 1)]
+    n_tangles = 0
+
+    perms = symmetry_permutations(n)
+    f, _ = prefix_matching(n, prefix)
+    stats = ChordStatistics(f)
+    partner = stats.partner
+
+    def extend(a, undecided):
+        nonlocal n_tangles
+        while a < 2*n and partner[a] != -1:
+            a += 1
+        if a == 2*n:
+            weight = (len(perms) + 1) // (len(undecided) + 1)
+            l = len(stats)
+            all_tangles[l] += weight
+            if stats.n_components() == 1:
+                one_component[l] += weight
+            n_tangles += weight
+            return
+        for b in range(a+1, 2*n):
+            if partner[b] != -1: continue
+            stats.add(a, b)
+            left = undecided_symmetries(partner, undecided)
+            if left is not None:
+                extend(a+1, left)
+            stats.remove(a, b)
+
+    undecided = undecided_symmetries(partner, perms)
+    if undecided is not None:
+        extend(0, undecided)
+
+    return one_component, all_tangles, n_tangles
+
+def count_prefix_numpy(args):
+    # same as count_prefix, with the statistics of the whole prefix computed by vectorized.py
+    import numpy as np
+    import vectorized
+
+    n, prefix = args
+    one_component = np.zeros(n*(n-1)//2 + 1, dtype = np.int64)
+    all_tangles = np.zeros(n*(n-1)//2 + 1, dtype = np.int64)
+    n_tangles = 0
+
+    # every prefix has (2(n-d)-1)!! matchings, d = prefix_depth(n)
+    block_size = min(10**5, double_fact(2*(n - prefix_depth(n)) - 1))
+    block = np.empty((block_size, 2*n), dtype = np.int16)
+    for m in vectorized.fill_blocks(perfect_matchings_prefix_deltas(n, prefix), block):
+        P = block[:m]
+        l = vectorized.lengths(P)
+        all_tangles += np.bincount(l, minlength = len(all_tangles))
+        one_component += np.bincount(l[vectorized.n_components(P) == 1], minlength = len(all_tangles))
+        n_tangles += len(P)
+
+    return one_component.tolist(), all_tangles.tolist(), n_tangles
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type = int, default = 8)
+    parser.add_argument("--shard", type = parse_shard, default = (0, 1), help = "enumerate only the slice i/k of B_n")
+    parser.add_argument("--workers", type = int, default = 1, help = "number of processes")
+    method = parser.add_mutually_exclusive_group()
+    method.add_argument("--numpy", action = "store_true", help = "process the tangles in blocks with NumPy")
+    method.add_argument("--symmetry", action = "store_true", help = "measure one tangle per orbit of the mirror and the flip")
+    checkpoint_arguments(parser)
+    args = parser.parse_args()
+
+    n = args.n
+    shard, n_shards = args.shard
+    size_bn = double_fact(2*n - 1)
+
+    print(n)
+
+    one_component = [0 for _ in range(n*(n-1)//2 + 1)]
+    all_tangles = [0 for _ in range(n*(n-1)//2 + 1)]
+
+    if n <= 8 and (shard, n_shards) == (0, 1) and (os.path.exists(f"BN/b{n}.fdb") or os.path.exists(f"BN/b{n}.pkl")):
+        print(f"Loading BN/b{n}")
+        bn = load_factorizations(f"BN/b{n}")
         for inv, fact in tqdm(bn.items()):
             l = len(fact)
             all_tangles[l] += 1
             if n_components(inv) == 1:
                 one_component[l] += 1
-else:
-
-    bd = brauer_diagrams(n)
-
-    for b in tqdm(bd, total = size_bn):
-        inv = [normalize(t) for t in b]
-        
-        tangle = Tangle(inv)
-        l = len(tangle)
-        all_tangles[l] += 1
-        if n_components(inv) == 1:
-            one_component[l] += 1
-
-print("Tangles with one component")
-print(one_component)
-
-print()
-
-print("All Tangles")
-print(all_tangles)
-
-
+    else:
+        lo, hi = shard_bounds(n, shard, n_shards)
+        size_shard = size_bn * (hi - lo) // number_of_prefixes(n)
+
+        path = checkpoint_path(args, f"number_of_tangles_b{n}_{shard}of{n_shards}.ckpt")
+        checkpointer = Checkpointer(path, args.checkpoint_every)
+        next_prefix = lo
+        state = checkpointer.load() if args.resume else None
+        if state is not None:
+            if state["n"] != n or state["shard"] != (shard, n_shards):
+                raise ValueError(f"{path} is the checkpoint of a different enumeration")
+            next_prefix = state["next_prefix"]
+            one_component = state["one_component"]
+            all_tangles = state["all_tangles"]
+            print(f"Resuming from {path} at prefix {next_prefix} of [{lo}, {hi})")
+
+        get_state = lambda: {
+            "n" : n,
+            "shard" : (shard, n_shards),
+            "next_prefix" : next_prefix,
+            "one_component" : one_component,
+            "all_tangles" : all_tangles
+        }
+
+        tasks = [(n, prefix) for prefix in range(next_prefix, hi)]
+        pool = Pool(args.workers) if args.workers > 1 else None
+        count = count_prefix_numpy if args.numpy else count_prefix_orbits if args.symmetry else count_prefix
+        results = pool.imap(count, tasks, chunksize = 16) if pool else map(count, tasks)
+
+        with tqdm(total = size_shard, initial = sum(all_tangles)) as pbar:
+            for _one_component, _all_tangles, n_tangles in results:
+                for l in range(len(all_tangles)):
+                    one_component[l] += _one_component[l]
+                    all_tangles[l] += _all_tangles[l]
+                next_prefix += 1
+                pbar.update(n_tangles)
+                checkpointer.maybe_save(get_state)
+
+        checkpointer.save(get_state())
+
+        if pool:
+            pool.close()
+            pool.join()
+
+    print("Tangles with one component")
+    print(one_component)
+
+    print()
+
+    print("All Tangles")
+    print(all_tangles)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,60 @@
 #all codes in here were adapted from sage.combinat.diagram_algebras
 #because this allows the usage of PyPy without the need of installing sage on it
 
-def perfect_matchings_iterator(n):
+from array import array
+
+def perfect_matchings_iterator(n, buffer = False):
+    """
+    Iterates the perfect matchings of ``2n`` points as lists of pairs.
+
+    With ``buffer = True`` nothing is allocated per matching: every item is
+    the same read-only memoryview of an internal array, where ``view[a]``
+    is the point matched with ``a``. The view is only valid until the next
+    iteration, which updates it in place, so a matching that has to be kept
+    must be copied (``list(view)``, ``bytes(view)``). See ``buffer_views``.
+    """
+    if buffer:
+        yield from buffer_views(perfect_matchings_deltas(n), 2*n)
+        return
+
+    for f, _ in perfect_matchings_deltas(n):
+        yield convert(f, n)
+
+def buffer_views(deltas, size, labels = None):
+    """
+    Yields, for every item of ``deltas`` (see ``perfect_matchings_deltas``),
+    the same read-only memoryview of an array of ``size`` signed bytes (or
+    shorts, for more than 128 points) holding the current involution. Only
+    the four entries changed by a step are written. If ``labels`` is given,
+    the view holds ``labels[f[a]]`` instead of ``f[a]``.
+    """
+    typecode = "b" if size <= 128 else "h"
+    values = array(typecode, [0]) * size
+    view = memoryview(values).toreadonly()
+    label = (lambda a: a) if labels is None else labels.__getitem__
+
+    for f, delta in deltas:
+        if delta is None:
+            for a in range(size):
+                values[a] = label(f[a])
+        else:
+            x, y, j, J = delta
+            values[x] = label(j)
+            values[j] = label(x)
+            values[y] = label(J)
+            values[J] = label(y)
+        yield view
+
+def perfect_matchings_deltas(n):
+    """
+    Same enumeration as ``perfect_matchings_iterator``, as a sequence of
+    changes of the involution ``f``. Yields ``(f, delta)``, where ``f`` is
+    the internal list, updated in place at every step, and ``delta`` is
+    None for the first matching and then ``(x, y, j, J)``: the pairs
+    ``(x, y)`` and ``(j, J)`` were replaced by ``(x, j)`` and ``(y, J)``.
+    """
     if n == 0:
-        yield []
+        yield [], None
         return
 
     i = 0
@@ -23,7 +74,7 @@ def perfect_matchings_iterator(n):
 
     odd = False
 
-    yield convert(f, n)
+    yield f, None
     while e[0] != n - 1:
         i = e[0]
         if odd:
@@ -50,7 +101,7 @@ def perfect_matchings_iterator(n):
             e[i] = e[i+1]
             e[i+1] = i + 1
 
-        yield convert(f, n)
+        yield f, (x, y, j, J)
 
 
 def convert(f,n):
@@ -65,11 +116,442 @@ def convert(f,n):
             ret.append((i, f[i]))
     return ret
 
-def brauer_diagrams(k):
+def brauer_diagrams(k, buffer = False):
     r"""
     from sage.combinat.diagram_algebras
+
+    With ``buffer = True`` every diagram is the same read-only memoryview,
+    valid until the next iteration, where ``view[a]`` is the node matched
+    with the node ``a+1`` for ``a < k`` and with the node ``a-2k`` otherwise
+    (the layout of ``CompactTangle``). See ``perfect_matchings_iterator``.
     """
     s = list(range(1,k+1)) + list(range(-k,0))
+    if buffer:
+        yield from buffer_views(perfect_matchings_deltas(k), 2*k, s)
+        return
+
     for p in perfect_matchings_iterator(k):
         b = [(s[a],s[b]) for a,b in p]
         yield b
+
+# Sharded enumeration.
+# A prefix fixes the partners of the first points: at each step the smallest
+# unmatched point is matched with one of the other unmatched points, so the
+# prefixes of depth d are indexed in mixed radix (2n-1)(2n-3)...(2n-2d+1)
+# and all of them have the same number of completions. A shard is a contiguous
+# range of prefixes, so shard i of k, split again into w parts, is exactly the
+# union of the shards i*w, ..., i*w + w-1 of k*w.
+
+MIN_PREFIXES = 4096
+
+def prefix_depth(n):
+    d = 0
+    n_prefixes = 1
+    while d < n - 1 and n_prefixes < MIN_PREFIXES:
+        n_prefixes *= 2*(n-d) - 1
+        d += 1
+    return d
+
+def number_of_prefixes(n):
+    n_prefixes = 1
+    for d in range(prefix_depth(n)):
+        n_prefixes *= 2*(n-d) - 1
+    return n_prefixes
+
+def shard_bounds(n, shard, n_shards):
+    """
+    Returns the range ``[lo, hi)`` of prefixes enumerated by the shard
+    ``shard`` (0-based) out of ``n_shards``.
+    """
+    if not 0 <= shard < n_shards:
+        raise ValueError(f"shard {shard} is not in [0, {n_shards})")
+    n_prefixes = number_of_prefixes(n)
+    return shard * n_prefixes // n_shards, (shard + 1) * n_prefixes // n_shards
+
+def parse_shard(text):
+    """
+    Parses a shard given as ``"i/k"``, with ``0 <= i < k``.
+    """
+    try:
+        shard, n_shards = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard {text!r}, expected i/k")
+    if not 0 <= shard < n_shards:
+        raise ValueError(f"invalid shard {text!r}, expected 0 <= i < k")
+    return shard, n_shards
+
+def perfect_matchings_prefix(n, prefix, buffer = False):
+    """
+    Iterates the perfect matchings of ``2n`` points whose first
+    ``prefix_depth(n)`` choices are given by ``prefix``. For ``buffer``
+    see ``perfect_matchings_iterator``.
+    """
+    if buffer:
+        yield from buffer_views(perfect_matchings_prefix_deltas(n, prefix), 2*n)
+        return
+
+    for f, _ in perfect_matchings_prefix_deltas(n, prefix):
+        yield convert(f, n)
+
+def prefix_matching(n, prefix):
+    """
+    The choices of the prefix ``prefix`` (see ``perfect_matchings_prefix``),
+    as an involution of the points matched so far with ``-1`` for the other
+    points, together with the list of the unmatched points.
+    """
+    depth = prefix_depth(n)
+    digits = []
+    for d in range(depth - 1, -1, -1):
+        prefix, digit = divmod(prefix, 2*(n-d) - 1)
+        digits.append(digit)
+    if prefix != 0:
+        raise ValueError("prefix out of range")
+
+    f = [-1 for _ in range(2*n)]
+    remaining = list(range(2*n))
+    for digit in reversed(digits):
+        a = remaining.pop(0)
+        b = remaining.pop(digit)
+        f[a] = b
+        f[b] = a
+    return f, remaining
+
+def perfect_matchings_prefix_deltas(n, prefix):
+    """
+    Same as ``perfect_matchings_prefix``, as a sequence of changes of the
+    involution, see ``perfect_matchings_deltas``.
+    """
+    f, remaining = prefix_matching(n, prefix)
+    for g, delta in perfect_matchings_deltas(n - prefix_depth(n)):
+        if delta is None:
+            for a, b in enumerate(g):
+                f[remaining[a]] = remaining[b]
+            yield f, None
+        else:
+            x, y, j, J = (remaining[a] for a in delta)
+            f[x] = j
+            f[j] = x
+            f[y] = J
+            f[J] = y
+            yield f, (x, y, j, J)
+
+def perfect_matchings_shard(n, shard, n_shards):
+    lo, hi = shard_bounds(n, shard, n_shards)
+    for prefix in range(lo, hi):
+        yield from perfect_matchings_prefix(n, prefix)
+
+def brauer_diagrams_prefix(k, prefix, buffer = False):
+    s = list(range(1,k+1)) + list(range(-k,0))
+    if buffer:
+        yield from buffer_views(perfect_matchings_prefix_deltas(k, prefix), 2*k, s)
+        return
+
+    for p in perfect_matchings_prefix(k, prefix):
+        b = [(s[a],s[b]) for a,b in p]
+        yield b
+
+def brauer_diagrams_shard(k, shard, n_shards):
+    lo, hi = shard_bounds(k, shard, n_shards)
+    for prefix in range(lo, hi):
+        yield from brauer_diagrams_prefix(k, prefix)
+
+# Symmetries.
+# The mirror i -> N+1-i and the flip i <-> -i of the Brauer diagrams act on
+# the points of the involutions (node i at index i-1, node -i at index 2N-i)
+# as the permutations below, and the image of f under a permutation g is
+# a -> g[f[g[a]]]. The statistics that do not change under a group of
+# symmetries only need one diagram per orbit, weighted by the size of the
+# orbit: the representative of an orbit is its smallest involution in
+# lexicographic order. The involutions are built by matching the smallest
+# unmatched point first, so the start of an image is known as soon as the
+# points it reads are matched, and a branch is cut when an image is already
+# smaller: the diagrams that are not representatives are mostly not visited.
+
+SYMMETRIES = ("mirror", "flip")
+
+def symmetry_permutations(n, symmetries = SYMMETRIES):
+    """
+    The elements other than the identity of the group generated by
+    ``symmetries``, as permutations of the ``2n`` points.
+    """
+    mirror = [n-1-a if a < n else 3*n-1-a for a in range(2*n)]
+    flip = [2*n-1-a for a in range(2*n)]
+    perms = []
+    if "mirror" in symmetries: perms.append(mirror)
+    if "flip" in symmetries: perms.append(flip)
+    if len(perms) == 2: perms.append([mirror[flip[a]] for a in range(2*n)])
+    return perms
+
+def symmetric_image(f, g):
+    return [g[f[g[a]]] for a in range(len(f))]
+
+def undecided_symmetries(f, perms):
+    """
+    Compares ``f``, an involution with ``-1`` for the unmatched points, with
+    its images under ``perms`` as far as they are known. Returns None if an
+    image is already smaller, so that ``f`` cannot be completed to a
+    representative, and otherwise the elements of ``perms`` whose image is
+    not known to be larger. If ``f`` is complete these are the ones fixing ``f``.
+    """
+    undecided = []
+    for g in perms:
+        for a in range(len(f)):
+            b = f[a]
+            c = f[g[a]]
+            if b == -1 or c == -1:
+                undecided.append(g)
+                break
+            c = g[c]
+            if c != b:
+                if c < b: return None
+                break
+        else:
+            undecided.append(g)
+    return undecided
+
+def orbit_size(f, perms):
+    """
+    Returns None if ``f`` is not the representative of its orbit under the
+    group of ``perms`` (see ``symmetry_permutations``), and the size of the
+    orbit otherwise.
+    """
+    fixing = undecided_symmetries(f, perms)
+    if fixing is None: return None
+    return (len(perms) + 1) // (len(fixing) + 1)
+
+def perfect_matchings_prefix_orbits(n, prefix, symmetries = SYMMETRIES):
+    """
+    Yields the pairs ``(matching, orbit size)`` of the representatives in the
+    prefix ``prefix`` (see ``perfect_matchings_prefix``). Over all the prefixes
+    there is exactly one representative per orbit of the perfect matchings.
+    """
+    perms = symmetry_permutations(n, symmetries)
+    f, _ = prefix_matching(n, prefix)
+
+    def extend(a, undecided):
+        while a < 2*n and f[a] != -1:
+            a += 1
+        if a == 2*n:
+            yield convert(f, n), (len(perms) + 1) // (len(undecided) + 1)
+            return
+        for b in range(a+1, 2*n):
+            if f[b] != -1: continue
+            f[a] = b
+            f[b] = a
+            left = undecided_symmetries(f, undecided)
+            if left is not None:
+                yield from extend(a+1, left)
+            f[a] = f[b] = -1
+
+    undecided = undecided_symmetries(f, perms)
+    if undecided is not None:
+        yield from extend(0, undecided)
+
+def brauer_diagrams_prefix_orbits(k, prefix, symmetries = SYMMETRIES):
+    s = list(range(1,k+1)) + list(range(-k,0))
+    for p, size in perfect_matchings_prefix_orbits(k, prefix, symmetries):
+        yield [(s[a],s[b]) for a,b in p], size
+
+def brauer_diagram_orbit(b, k, symmetries = SYMMETRIES):
+    """
+    The distinct diagrams of the orbit of the Brauer diagram ``b``, in the
+    format of ``brauer_diagrams``, starting with ``b`` itself.
+    """
+    s = list(range(1,k+1)) + list(range(-k,0))
+    f = diagram_to_involution(b, k)
+
+    images = [f]
+    for g in symmetry_permutations(k, symmetries):
+        image = symmetric_image(f, g)
+        if image not in images:
+            images.append(image)
+
+    return [[(s[a],s[c]) for a,c in convert(image, k)] for image in images]
+
+def brauer_diagrams_orbits(k, symmetries = SYMMETRIES):
+    """
+    Yields one Brauer diagram per orbit under ``symmetries``, with the size of the orbit.
+    """
+    for prefix in range(number_of_prefixes(k)):
+        yield from brauer_diagrams_prefix_orbits(k, prefix, symmetries)
+
+# Ranking.
+# The rank of a perfect matching is its index in the order used by the
+# prefixes above: the digits of the rank in mixed radix (2n-1)(2n-3)...1
+# are, for every step, the position of the partner of the smallest unmatched
+# point among the other unmatched points. The prefix p of perfect_matchings_prefix
+# therefore contains exactly the ranks [p*c, (p+1)*c), with c = (2(n-d)-1)!!
+# and d = prefix_depth(n).
+
+class FenwickTree:
+    def __init__(self, n, value = 0):
+        # every position starts at value
+        self.tree = [value * (i & -i) for i in range(n+1)]
+
+    def add(self, i, v = 1):
+        # adds v to the (0-based) position i
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += v
+            i += i & -i
+
+    def prefix_sum(self, i):
+        # sum of the positions 0, ..., i-1
+        tree = self.tree
+        s = 0
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def find(self, k):
+        # smallest position i such that prefix_sum(i+1) >= k, for non-negative values
+        tree = self.tree
+        i = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step > 0:
+            if i + step < len(tree) and tree[i + step] < k:
+                i += step
+                k -= tree[i]
+            step >>= 1
+        return i
+
+def number_of_matchings(n):
+    count = 1
+    for i in range(1, 2*n, 2):
+        count *= i
+    return count
+
+def rank_involution(f):
+    """
+    Rank of the fixed-point free involution ``f`` of ``{0, ..., 2n-1}``,
+    in ``O(n log n)``.
+    """
+    n = len(f) // 2
+    unmatched = FenwickTree(2*n, 1)
+    r = 0
+    t = 0
+    for a in range(2*n):
+        b = f[a]
+        if b < a: continue
+        digit = unmatched.prefix_sum(b) - unmatched.prefix_sum(a+1)
+        r = r * (2*(n-t) - 1) + digit
+        unmatched.add(a, -1)
+        unmatched.add(b, -1)
+        t += 1
+    return r
+
+def unrank_involution(n, r):
+    """
+    Inverse of ``rank_involution``: the fixed-point free involution of
+    ``{0, ..., 2n-1}`` with rank ``r``, in ``O(n log n)``.
+    """
+    if not 0 <= r < number_of_matchings(n):
+        raise ValueError(f"rank {r} out of range for n = {n}")
+
+    digits = []
+    for t in range(n-1, -1, -1):
+        r, digit = divmod(r, 2*(n-t) - 1)
+        digits.append(digit)
+
+    f = [-1 for _ in range(2*n)]
+    unmatched = FenwickTree(2*n, 1)
+    a = 0
+    for digit in reversed(digits):
+        while f[a] != -1:
+            a += 1
+        # a is the first unmatched point, its partner is the (digit+2)-th one
+        b = unmatched.find(digit + 2)
+        f[a] = b
+        f[b] = a
+        unmatched.add(a, -1)
+        unmatched.add(b, -1)
+    return f
+
+def rank_matching(p):
+    """
+    Rank of a perfect matching given as a list of pairs, as yielded
+    by ``perfect_matchings_iterator``.
+    """
+    f = [0 for _ in range(2*len(p))]
+    for a, b in p:
+        f[a] = b
+        f[b] = a
+    return rank_involution(f)
+
+def unrank_matching(n, r):
+    return convert(unrank_involution(n, r), n)
+
+def perfect_matchings_from_rank(n, r = 0):
+    """
+    Iterates the perfect matchings of ``2n`` points in rank order,
+    starting from the rank ``r``.
+    """
+    if r == number_of_matchings(n):
+        return
+
+    f = unrank_involution(n, r)
+    # levels[t] are the unmatched points before step t, digits[t] the choice at step t
+    levels = [list(range(2*n))]
+    digits = []
+    for t in range(n):
+        remaining = levels[t]
+        digit = remaining.index(f[remaining[0]]) - 1
+        digits.append(digit)
+        levels.append(remaining[1:digit+1] + remaining[digit+2:])
+
+    while True:
+        yield convert(f, n)
+
+        t = n - 1
+        while t >= 0 and digits[t] == 2*(n-t) - 2:
+            t -= 1
+        if t < 0:
+            return
+
+        digits[t] += 1
+        for u in range(t, n):
+            if u > t:
+                digits[u] = 0
+            remaining = levels[u]
+            a = remaining[0]
+            b = remaining[digits[u] + 1]
+            f[a] = b
+            f[b] = a
+            levels[u+1] = remaining[1:digits[u]+1] + remaining[digits[u]+2:]
+
+def node_index(x, k):
+    # the node i is the point i-1 of the involutions and the node -i the point 2k-i
+    return x - 1 if x > 0 else 2*k + x
+
+def diagram_to_involution(b, k):
+    """
+    The involution (partner list) of the Brauer diagram ``b`` of ``B_k``,
+    given as pairs of nodes.
+    """
+    f = [0 for _ in range(2*k)]
+    for x, y in b:
+        f[node_index(x, k)] = node_index(y, k)
+        f[node_index(y, k)] = node_index(x, k)
+    return f
+
+def rank_diagram(b):
+    """
+    Rank of the Brauer diagram ``b``, given as a collection of pairs of
+    nodes ``1, ..., k, -1, ..., -k`` (for example the edges of a tangle or
+    the ``base_diagram()`` of a SageMath Brauer diagram). The rank is an
+    integer in ``[0, (2k-1)!!)`` and can replace the list of pairs as a key.
+    """
+    b = list(b)
+    return rank_involution(diagram_to_involution(b, len(b)))
+
+def unrank_diagram(k, r):
+    s = list(range(1,k+1)) + list(range(-k,0))
+    return [(s[a],s[b]) for a,b in unrank_matching(k, r)]
+
+def brauer_diagrams_from_rank(k, r = 0):
+    s = list(range(1,k+1)) + list(range(-k,0))
+    for p in perfect_matchings_from_rank(k, r):
+        b = [(s[a],s[b]) for a,b in p]
+        yield b
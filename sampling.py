@@ -0,0 +1,128 @@
+#uniform random Brauer diagrams, for Monte Carlo estimates when B_N is too large to enumerate
+#usage: python sampling.py N [--samples M] [--seed S] [--transversals K] [--numpy]
+#prints the estimated distribution of the length of the tangles of B_N (or of the tangles
+#with K transversal edges)
+#
+#the diagrams are sampled as partner arrays in the layout of CompactTangle (node i at
+#index i-1, node -i at index 2N-i): a uniformly random pairing of the 2N indices is a
+#uniformly random Brauer diagram, and it is drawn with one shuffle in O(N)
+
+import argparse
+import random
+from array import array
+
+from brauermonoid import CompactTangle, chord_crossings, normalize_edge
+
+def _rng(seed):
+    # seed can be None, an integer or an existing random.Random
+    if isinstance(seed, random.Random): return seed
+    return random.Random(seed)
+
+def _check_transversals(N, k):
+    if not 0 <= k <= N or (N - k) % 2 != 0:
+        raise ValueError(f"a diagram with {N} strands cannot have {k} transversal edges")
+
+def random_partner(N, seed = None, transversals = None):
+    ''' Partner array of a uniformly random Brauer diagram with N strands, or of a
+    uniformly random diagram with the given number of transversal edges.
+    '''
+    rng = _rng(seed)
+    partner = array("h", [0]) * (2*N)
+
+    def pair(a, b):
+        partner[a] = b
+        partner[b] = a
+
+    if transversals is None:
+        nodes = list(range(2*N))
+        rng.shuffle(nodes)
+        for k in range(0, 2*N, 2):
+            pair(nodes[k], nodes[k+1])
+        return partner
+
+    # the first k nodes of the shuffled rows are the endpoints of the transversal
+    # edges, matched in order, and the others are paired inside their row
+    k = transversals
+    _check_transversals(N, k)
+    top = list(range(N))
+    bottom = list(range(N, 2*N))
+    rng.shuffle(top)
+    rng.shuffle(bottom)
+    for j in range(k):
+        pair(top[j], bottom[j])
+    for j in range(k, N, 2):
+        pair(top[j], top[j+1])
+        pair(bottom[j], bottom[j+1])
+    return partner
+
+def random_edges(N, seed = None, transversals = None):
+    ''' Edges of a uniformly random Brauer diagram, oriented as in Tangle, see random_partner.
+    '''
+    partner = random_partner(N, seed, transversals)
+    node = lambda a: a + 1 if a < N else a - 2*N
+    return [normalize_edge((node(a), node(b))) for a, b in enumerate(partner) if a < b]
+
+def total_crossings(partner):
+    return sum(chord_crossings(partner)) // 4
+
+def random_tangle(N, seed = None, tangle_class = CompactTangle, transversals = None, crossings = None, max_tries = 10**6):
+    ''' Uniformly random tangle with N strands. \n
+    Arguments:
+        seed : None, an integer or a random.Random \n
+        tangle_class : CompactTangle or Tangle \n
+        transversals : if given, the tangle is uniform among the ones with this number of transversal edges \n
+        crossings : if given, the tangle is uniform among the ones with this total number of crossings
+        (and transversal edges), sampled by rejection with at most max_tries attempts
+    '''
+    rng = _rng(seed)
+    for _ in range(max_tries):
+        partner = random_partner(N, rng, transversals)
+        if crossings is None or total_crossings(partner) == crossings:
+            break
+    else:
+        raise ValueError(f"no tangle with {crossings} crossings found in {max_tries} attempts")
+
+    X = CompactTangle.from_partner(partner)
+    if tangle_class is CompactTangle: return X
+    return X.to_tangle()
+
+def random_tangles(N, count, seed = None, **kwargs):
+    ''' Yields count independent random tangles, see random_tangle.
+    '''
+    rng = _rng(seed)
+    for _ in range(count):
+        yield random_tangle(N, rng, **kwargs)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Estimate the distribution of the length of the tangles of B_N by uniform sampling.")
+    parser.add_argument("N", type = int, help = "number of strands")
+    parser.add_argument("--samples", type = int, default = 10**4, help = "number of sampled tangles")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--transversals", type = int, default = None, help = "sample only the tangles with this number of transversal edges")
+    parser.add_argument("--numpy", action = "store_true", help = "sample and measure in blocks with NumPy (see vectorized.py)")
+    args = parser.parse_args(argv)
+
+    histogram = {}
+    if args.numpy:
+        import numpy as np
+        from vectorized import lengths, random_partner_matrix
+
+        rng = np.random.default_rng(args.seed)
+        block = 10**4
+        for start in range(0, args.samples, block):
+            P = random_partner_matrix(min(block, args.samples - start), args.N, rng, args.transversals)
+            values, counts = np.unique(lengths(P), return_counts = True)
+            for l, c in zip(values.tolist(), counts.tolist()):
+                histogram[l] = histogram.get(l, 0) + c
+    else:
+        for X in random_tangles(args.N, args.samples, args.seed, transversals = args.transversals):
+            l = len(X)
+            histogram[l] = histogram.get(l, 0) + 1
+
+    mean = sum(l * c for l, c in histogram.items()) / args.samples
+    print(f"mean length {mean:.4f} over {args.samples} samples")
+    for l in sorted(histogram):
+        print(f"{l} {histogram[l] / args.samples:.6f}")
+
+if __name__ == "__main__":
+    main()
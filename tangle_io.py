@@ -0,0 +1,167 @@
+#streaming readers and writers of tangles and factorizations
+#the readers are generators that parse one record at a time and the writers consume
+#their input lazily, so files of any size are processed in bounded memory
+#
+#formats:
+#  text   : one tangle per line in the format of text_to_tangle, and one factorization
+#           per line as comma separated factor names (I for the identity)
+#  ndjson : one JSON object per line, {"tangle": "<text format>"} for tangles and
+#           {"factorization": [factor names]} for factorizations
+#  binary : a tangle is a little-endian uint16 N followed by the 2N int16 entries of its
+#           partner array in the layout of CompactTangle, a factorization is a uint16
+#           length followed by that many int16 factor codes (see brauermonoid.factor_code)
+
+import json
+import struct
+import sys
+from array import array
+
+from brauermonoid import CompactTangle, Tangle, partner_array, tangle_to_text, text_to_tangle, word_from_names, word_to_names
+
+FORMATS = ("text", "ndjson", "binary")
+LENGTH = struct.Struct("<H")
+
+def _check_format(format):
+    if format not in FORMATS:
+        raise ValueError(f"unknown format {format}, expected one of {', '.join(FORMATS)}")
+
+def open_stream(path, mode, format = "text"):
+    ''' Opens path for reading (mode "r") or writing (mode "w") in the mode required by
+    format. "-" is stdin or stdout, which are not closed when the stream is closed.
+    '''
+    _check_format(format)
+    closefd = True
+    if path == "-":
+        path = (sys.stdin if mode == "r" else sys.stdout).fileno()
+        closefd = False
+    if format == "binary":
+        return open(path, mode + "b", closefd = closefd)
+    return open(path, mode, encoding = "utf-8", closefd = closefd)
+
+def _read_exactly(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise EOFError(f"truncated record: expected {n} bytes, got {len(data)}")
+    return data
+
+def _int16_array(data):
+    values = array("h")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _int16_bytes(values):
+    values = array("h", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _lines(f):
+    for line in f:
+        line = line.strip()
+        if line != "":
+            yield line
+
+def _binary_records(f, width):
+    # a record is a length n followed by width * n int16 values
+    while True:
+        header = f.read(LENGTH.size)
+        if len(header) == 0: return
+        if len(header) != LENGTH.size:
+            raise EOFError("truncated record header")
+        (n,) = LENGTH.unpack(header)
+        yield _int16_array(_read_exactly(f, 2 * width * n))
+
+def read_records(f, format = "text"):
+    ''' Yields the tangles of f without building them: strings in the format of
+    text_to_tangle for text and ndjson, partner arrays for binary. Records are
+    cheaper than tangles to send to other processes, see parse_record.
+    '''
+    _check_format(format)
+    if format == "text":
+        yield from _lines(f)
+    elif format == "ndjson":
+        for line in _lines(f):
+            yield json.loads(line)["tangle"]
+    else:
+        yield from _binary_records(f, 2)
+
+def _check_partner(partner):
+    # a binary record must be a fixed-point free involution of its indices
+    n = len(partner)
+    for a, b in enumerate(partner):
+        if not 0 <= b < n or b == a or partner[b] != a:
+            raise ValueError(f"invalid partner array: index {a} is matched with {b}")
+
+def parse_record(record, tangle_class = Tangle):
+    ''' Builds the tangle of a record yielded by read_records.
+    '''
+    if isinstance(record, str):
+        return text_to_tangle(record, tangle_class)
+
+    _check_partner(record)
+    X = CompactTangle.from_partner(record)
+    if tangle_class is CompactTangle: return X
+    return X.to_tangle()
+
+def read_tangles(f, format = "text", tangle_class = Tangle):
+    ''' Lazily yields the tangles of f, one at a time.
+    '''
+    for record in read_records(f, format):
+        yield parse_record(record, tangle_class)
+
+def write_tangles(f, tangles, format = "text"):
+    ''' Writes the tangles (or records of read_records) of an iterable to f, one at a time.
+    Returns the number of tangles written.
+    '''
+    _check_format(format)
+    count = 0
+    for X in tangles:
+        if format == "binary":
+            partner = X if isinstance(X, array) else partner_array(X)
+            f.write(LENGTH.pack(len(partner) // 2))
+            f.write(_int16_bytes(partner))
+        else:
+            text = X if isinstance(X, str) else tangle_to_text(X)
+            if format == "ndjson":
+                text = json.dumps({"tangle" : text})
+            f.write(text + "\n")
+        count += 1
+    return count
+
+def read_factorizations(f, format = "text", names = False):
+    ''' Lazily yields the factorizations of f as arrays of factor codes
+    (see brauermonoid.word_to_names). With names = True the text and ndjson
+    factorizations are yielded as the lists of names in the file, unchecked.
+    '''
+    _check_format(format)
+    convert = list if names else word_from_names
+    if format == "text":
+        for line in _lines(f):
+            yield convert(line.split(","))
+    elif format == "ndjson":
+        for line in _lines(f):
+            yield convert(json.loads(line)["factorization"])
+    else:
+        yield from _binary_records(f, 1)
+
+def write_factorizations(f, factorizations, format = "text"):
+    ''' Writes the factorizations of an iterable to f, one at a time. A factorization is
+    a list of factor names or an array of factor codes. Returns the number written.
+    '''
+    _check_format(format)
+    count = 0
+    for F in factorizations:
+        if format == "binary":
+            word = F if isinstance(F, array) else word_from_names(F)
+            f.write(LENGTH.pack(len(word)))
+            f.write(_int16_bytes(word))
+        else:
+            names = word_to_names(word_from_names(F))
+            if format == "ndjson":
+                f.write(json.dumps({"factorization" : names}) + "\n")
+            else:
+                f.write(",".join(names) + "\n")
+        count += 1
+    return count
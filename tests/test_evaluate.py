@@ -0,0 +1,41 @@
+# regression tests of the evaluator of words (brauermonoid.evaluate_word) and of the
+# verification of factorizations, run with: python -m pytest tests
+
+import pytest
+
+from brauermonoid import CompactTangle, evaluate_word, factor_code, factorizeBN, is_factorization, partner_array, text_to_tangle
+from factorize import verify
+
+X = text_to_tangle("1:4,2:4',3:5,6:1',2':3',5':6'")
+
+def test_factorizeBN_is_a_factorization():
+    assert is_factorization(X, factorizeBN(X))
+    assert is_factorization(CompactTangle(X.inv), factorizeBN(X))
+
+def test_evaluate_word_of_names_and_codes():
+    word = factorizeBN(X)
+    assert evaluate_word(word, X.N) == partner_array(X)
+    assert evaluate_word([factor_code(name) for name in word], X.N) == partner_array(X)
+
+@pytest.mark.parametrize("name", ["U0", "T0", "U-1", "V1", "U", ""])
+def test_factor_code_rejects_invalid_names(name):
+    with pytest.raises(ValueError):
+        factor_code(name)
+
+def test_factors_outside_BN_are_rejected():
+    with pytest.raises(ValueError):
+        evaluate_word([-7], 3)
+    with pytest.raises(ValueError):
+        evaluate_word(["U3"], 3)
+
+def test_factors_outside_BN_are_not_factorizations():
+    assert not is_factorization(text_to_tangle("1:2,1':2'"), ["U3"])
+    assert not is_factorization(text_to_tangle("1:2,1':2',3:3'"), ["U5"])
+
+def test_verify_reports_factors_outside_BN():
+    Y = text_to_tangle("1:2,1':2'")
+    results = list(verify([X, Y, Y], [factorizeBN(X), ["U1"], ["U3"]], workers = 1))
+    assert results == [True, True, False]
+
+def test_verify_reports_missing_pairs():
+    assert list(verify([X, X], [factorizeBN(X)], workers = 1)) == [True, False]
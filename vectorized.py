@@ -0,0 +1,168 @@
+#batched statistics of many tangles at once with NumPy
+#a batch is an (M, 2N) integer matrix whose rows are partner arrays in the layout of
+#CompactTangle (node i at index i-1, node -i at index 2N-i), which is also the layout
+#of the involutions of pmatch, so blocks can be filled directly from the enumeration
+
+import numpy as np
+
+from brauermonoid import EdgeType, partner_array
+
+def partner_matrix(tangles):
+    ''' Stacks tangles (Tangle, CompactTangle or partner arrays) into an (M, 2N) matrix.
+    '''
+    return np.array([partner_array(X) for X in tangles], dtype = np.int16)
+
+def matching_blocks(matchings, n, block_size = 10**5):
+    ''' Packs an iterable of perfect matchings of 2n points, given as lists of pairs
+    as yielded by pmatch.perfect_matchings_iterator, into partner matrices of at most
+    block_size rows.
+    '''
+    block = np.empty((block_size, 2*n), dtype = np.int16)
+    m = 0
+    for p in matchings:
+        row = block[m]
+        for a, b in p:
+            row[a] = b
+            row[b] = a
+        m += 1
+        if m == block_size:
+            yield block.copy()
+            m = 0
+    if m > 0:
+        yield block[:m].copy()
+
+def fill_blocks(deltas, out):
+    ''' Fills the preallocated (K, 2N) matrix out with the involutions of deltas, as
+    yielded by pmatch.perfect_matchings_deltas or perfect_matchings_prefix_deltas,
+    and yields the number m of rows filled every time out is full and at the end.
+    out is overwritten by the next block: its first m rows must be consumed (or
+    copied) before resuming the iteration. Every row is a copy of the previous one
+    with the four entries changed by the step.
+    '''
+    K = out.shape[0]
+    m = 0
+    for f, delta in deltas:
+        row = out[m]
+        if delta is None or m == 0:
+            row[:] = f
+        else:
+            row[:] = out[m-1]
+            x, y, j, J = delta
+            row[x] = j
+            row[j] = x
+            row[y] = J
+            row[J] = y
+        m += 1
+        if m == K:
+            yield m
+            m = 0
+    if m > 0:
+        yield m
+
+def random_partner_matrix(M, N, seed = None, transversals = None):
+    ''' M independent uniformly random Brauer diagrams with N strands as an (M, 2N)
+    partner matrix, or uniformly random diagrams with the given number of transversal
+    edges, as sampling.random_partner. seed is anything accepted by np.random.default_rng.
+    '''
+    rng = np.random.default_rng(seed)
+    P = np.empty((M, 2*N), dtype = np.int16)
+    rows = np.arange(M)[:, None]
+
+    def pair(a, b):
+        P[rows, a] = b
+        P[rows, b] = a
+
+    if transversals is None:
+        nodes = rng.permuted(np.tile(np.arange(2*N, dtype = np.int16), (M, 1)), axis = 1)
+        pair(nodes[:, 0::2], nodes[:, 1::2])
+        return P
+
+    k = transversals
+    if not 0 <= k <= N or (N - k) % 2 != 0:
+        raise ValueError(f"a diagram with {N} strands cannot have {k} transversal edges")
+    top = rng.permuted(np.tile(np.arange(N, dtype = np.int16), (M, 1)), axis = 1)
+    bottom = rng.permuted(np.tile(np.arange(N, 2*N, dtype = np.int16), (M, 1)), axis = 1)
+    pair(top[:, :k], bottom[:, :k])
+    pair(top[:, k::2], top[:, k+1::2])
+    pair(bottom[:, k::2], bottom[:, k+1::2])
+    return P
+
+def node_labels(N):
+    # label of every index: 1, ..., N, -N, ..., -1
+    return np.concatenate((np.arange(1, N+1), np.arange(-N, 0))).astype(np.int16)
+
+def edge_sizes(P):
+    ''' Size of the edge of every node, as brauermonoid.size.
+    '''
+    N = P.shape[1] // 2
+    labels = np.abs(node_labels(N))
+    return np.abs(labels[None, :] - labels[P]).astype(np.int16)
+
+def crossing_counts(P):
+    ''' Number of crossings of the edge of every node, as Tangle.get_n_crossings(edge).
+    Two chords cross when exactly one endpoint of one lies strictly between the
+    endpoints of the other, and the index order is the reversed phi order, so the
+    count only needs 2N vectorized passes over the batch.
+    '''
+    M, two_N = P.shape
+    idx = np.arange(two_N, dtype = P.dtype)[None, :]
+    lo = np.minimum(idx, P)
+    hi = np.maximum(idx, P)
+    counts = np.zeros(P.shape, dtype = np.int16)
+    for k in range(two_N):
+        pk = P[:, k:k+1]
+        inside = (lo < k) & (k < hi)
+        outside = (pk < lo) | (pk > hi)
+        counts += inside & outside
+    return counts
+
+def total_crossings(P, crossings = None):
+    if crossings is None:
+        crossings = crossing_counts(P)
+    return crossings.sum(axis = 1, dtype = np.int64) // 4
+
+def lengths(P, crossings = None):
+    ''' Length of every tangle of the batch, as len(Tangle).
+    '''
+    if crossings is None:
+        crossings = crossing_counts(P)
+    per_node = np.maximum(edge_sizes(P), crossings)
+    # every edge is counted at both of its endpoints
+    return per_node.sum(axis = 1, dtype = np.int64) // 4
+
+def n_components(P):
+    ''' Number of blocks of every tangle, as n_components in number_of_tangles_with_k_factors.py:
+    the gap between the strands i and i+1 separates two blocks when no edge spans it.
+    '''
+    N = P.shape[1] // 2
+    labels = np.abs(node_labels(N))
+    a = labels[None, :].repeat(P.shape[0], axis = 0)
+    b = labels[P]
+    lo = np.minimum(a, b)
+    hi = np.maximum(a, b)
+    components = np.ones(P.shape[0], dtype = np.int64)
+    for i in range(1, N):
+        covered = ((lo <= i) & (i < hi)).any(axis = 1)
+        components += ~covered
+    return components
+
+def edge_types(P):
+    ''' EdgeType value of the edge of every node.
+    '''
+    N = P.shape[1] // 2
+    labels = node_labels(N)
+    x = labels[None, :].repeat(P.shape[0], axis = 0)
+    y = labels[P]
+    top = np.maximum(x, y)
+    bottom = -np.minimum(x, y)
+    types = np.full(P.shape, EdgeType.zero_transversal.value, dtype = np.int8)
+    types[top > bottom] = EdgeType.positive_transversal.value
+    types[top < bottom] = EdgeType.negative_transversal.value
+    types[(x > 0) & (y > 0)] = EdgeType.upper_hook.value
+    types[(x < 0) & (y < 0)] = EdgeType.lower_hook.value
+    return types
+
+def length_histogram(P, minlength = 0):
+    ''' Number of tangles of the batch of every length.
+    '''
+    return np.bincount(lengths(P), minlength = minlength)